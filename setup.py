@@ -31,10 +31,10 @@ setuptools.setup(
     keywords="yugioh,ygo,ygojson",
     packages=setuptools.find_packages("src"),
     python_requires=">=3.8, <4",
-    install_requires=["Flask", "lark", "ygojson"],
+    install_requires=["Flask", "lark", "numpy", "ygojson"],
     extras_require={
         "dev": ["pre-commit", "watchdog"],
-        "test": [],
+        "test": ["pytest"],
     },
     package_dir={
         "": "src",
@@ -1,33 +1,30 @@
 import datetime
 import enum
+import json
 import math
-import os
 import random
 import time
 import typing
 import uuid
 
+import click
 import flask
 import jinja2.filters
 import tqdm
 import ygojson
 
+import yjviewer.api as api
+import yjviewer.benchmark as benchmark
+import yjviewer.loader as loader
 import yjviewer.search as search
+import yjviewer.searchindex as searchindex
+import yjviewer.snapshot as snapshot
+import yjviewer.synthetic as synthetic
 
 from .locales import LOCALE_TRANSLATED
 from .version import __version__
 
-if os.path.exists(ygojson.AGGREGATE_DIR):
-    ygodb = ygojson.load_from_file(aggregates_dir=ygojson.AGGREGATE_DIR)
-else:
-    ygodb = ygojson.load_from_internet(aggregates_dir=ygojson.AGGREGATE_DIR)
-ygodb.regenerate_backlinks()
-
-portenial_cotd = [x for x in ygodb.cards if x.images and x.images[0].card_art]
-cards_of_the_day = [random.choice(portenial_cotd) for i in range(5)]
-del portenial_cotd
-
-app = flask.Flask(__name__)
+views = flask.Blueprint("yjviewer", __name__, cli_group=None)
 
 ENUM_TRANSLATED: typing.Dict[enum.Enum, str] = {
     ygojson.CardType.MONSTER: "Monster",
@@ -185,28 +182,28 @@ FORMAT_TRANSLATED = {
 }
 
 
-@app.template_filter()
+@views.app_template_filter()
 def zfill(s, n: int):
     return str(s).zfill(n)
 
 
-@app.template_filter()
+@views.app_template_filter()
 def translateenum(e: enum.Enum):
     return ENUM_TRANSLATED.get(e, e)
 
 
-@app.template_filter()
+@views.app_template_filter()
 def translateenums(es: typing.Iterable[enum.Enum]) -> typing.Iterable:
     for e in es:
         yield translateenum(e)
 
 
-@app.template_filter()
+@views.app_template_filter()
 def translateformat(f: ygojson.Format) -> str:
     return FORMAT_TRANSLATED.get(f, f.value)
 
 
-@app.template_filter()
+@views.app_template_filter()
 def translatelocale(l: ygojson.Locale) -> str:
     return LOCALE_TRANSLATED.get(l, l.value)
 
@@ -249,7 +246,7 @@ def getDefaultLegality(
         return ygojson.Legality.UNLIMITED
 
 
-@app.template_filter()
+@views.app_template_filter()
 def currentlegality(
     card: ygojson.Card, format: ygojson.Format
 ) -> typing.Optional[ygojson.Legality]:
@@ -266,7 +263,7 @@ def currentlegality(
     return getDefaultLegality(card, format)
 
 
-@app.template_filter()
+@views.app_template_filter()
 def getlocales(
     thing: typing.Union[ygojson.Set, ygojson.SealedProduct],
 ) -> typing.Iterable[
@@ -278,7 +275,7 @@ def getlocales(
     yield from thing.locales.values()
 
 
-@app.template_filter()
+@views.app_template_filter()
 def getlocalecontents(
     thing: typing.Union[ygojson.Set, ygojson.SealedProduct],
     locale: typing.Optional[
@@ -293,7 +290,7 @@ def getlocalecontents(
             yield content
 
 
-@app.template_filter()
+@views.app_template_filter()
 def getseteditions(
     set_: ygojson.Set, locale: typing.Optional[ygojson.SetLocale]
 ) -> typing.Iterable[typing.Optional[ygojson.SetEdition]]:
@@ -312,7 +309,7 @@ def getseteditions(
 CARD_BACK_URL = "https://ms.yugipedia.com//e/e5/Back-EN.png"
 
 
-@app.template_filter()
+@views.app_template_filter()
 def printingimage(
     set_: ygojson.Set,
     card: ygojson.Card,
@@ -328,7 +325,7 @@ def printingimage(
             return card.images[0].card_art or CARD_BACK_URL
         return CARD_BACK_URL
 
-    printing = ygodb.printings_by_id[
+    printing = flask.g.generation.db.printings_by_id[
         printing.id
     ]  # Flask loves to make copies of random objects
 
@@ -346,7 +343,7 @@ def printingimage(
     return CARD_BACK_URL
 
 
-@app.template_filter()
+@views.app_template_filter()
 def dbsetlinks(db_ids: typing.Iterable[int]) -> typing.Iterable[str]:
     return [
         f'<a href="https://www.db.yugioh-card.com/yugiohdb/card_search.action?ope=1&pid={id}&rp=99999&request_locale=en">{id}</a>'
@@ -361,7 +358,7 @@ PREFERRED_LOCALES = [
 ]
 
 
-@app.template_filter()
+@views.app_template_filter()
 def setgenericpackimage(set_: ygojson.Set) -> str:
     for preferred_locale in PREFERRED_LOCALES:
         if preferred_locale in set_.locales and set_.locales[preferred_locale].image:
@@ -375,12 +372,12 @@ def setgenericpackimage(set_: ygojson.Set) -> str:
     return ""
 
 
-@app.template_filter()
+@views.app_template_filter()
 def setgenericimage(set_: ygojson.Set) -> str:
     return setgenericpackimage(set_) or CARD_BACK_URL
 
 
-@app.template_filter()
+@views.app_template_filter()
 def productgenericimage(product: ygojson.SealedProduct) -> str:
     for preferred_locale in PREFERRED_LOCALES:
         if (
@@ -397,19 +394,19 @@ def productgenericimage(product: ygojson.SealedProduct) -> str:
     return CARD_BACK_URL
 
 
-@app.template_filter()
+@views.app_template_filter()
 def seriesgenericimage(series: ygojson.Series) -> str:
     return CARD_BACK_URL
 
 
-@app.template_filter()
+@views.app_template_filter()
 def setformats(set_: ygojson.Set) -> typing.Iterable[ygojson.Format]:
     return {
         f for l in set_.contents for f in l.formats
     }  # TODO: stop using deprecated member
 
 
-@app.template_filter()
+@views.app_template_filter()
 def cardlocales(card: ygojson.Card) -> typing.Iterable[ygojson.Locale]:
     return sorted(
         {
@@ -427,7 +424,7 @@ def cardlocales(card: ygojson.Card) -> typing.Iterable[ygojson.Locale]:
     )
 
 
-@app.template_filter()
+@views.app_template_filter()
 def cardformats(card: ygojson.Card) -> typing.Iterable[str]:
     return sorted(
         {
@@ -440,7 +437,7 @@ def cardformats(card: ygojson.Card) -> typing.Iterable[str]:
     )
 
 
-@app.template_filter()
+@views.app_template_filter()
 def cardeditions(card: ygojson.Card) -> typing.Iterable[ygojson.SetEdition]:
     return sorted(
         {
@@ -454,7 +451,7 @@ def cardeditions(card: ygojson.Card) -> typing.Iterable[ygojson.SetEdition]:
     )
 
 
-@app.template_filter()
+@views.app_template_filter()
 def cardrarities(card: ygojson.Card) -> typing.Iterable[ygojson.CardRarity]:
     return sorted(
         {
@@ -468,7 +465,7 @@ def cardrarities(card: ygojson.Card) -> typing.Iterable[ygojson.CardRarity]:
     )
 
 
-@app.template_filter()
+@views.app_template_filter()
 def printingformat(
     printing: typing.Optional[ygojson.CardPrinting],
     locale: typing.Optional[ygojson.SetLocale],
@@ -479,10 +476,10 @@ def printingformat(
     return "/".join(x.value for x in content.formats)
 
 
-@app.template_filter()
+@views.app_template_filter()
 def setproducts(set_: ygojson.Set) -> typing.List[ygojson.SealedProduct]:
     result = []
-    for product in ygodb.products:
+    for product in flask.g.generation.db.products:
         yielded = False
         for contents in product.contents:
             for pack in contents.packs:
@@ -495,12 +492,12 @@ def setproducts(set_: ygojson.Set) -> typing.List[ygojson.SealedProduct]:
     return result
 
 
-@app.template_filter()
+@views.app_template_filter()
 def getdistrobyid(id: uuid.UUID) -> typing.Optional[ygojson.PackDistrobution]:
-    return ygodb.distros_by_id.get(id)
+    return flask.g.generation.db.distros_by_id.get(id)
 
 
-@app.template_filter()
+@views.app_template_filter()
 def distrolen(
     distro: ygojson.PackDistrobution, locales: typing.Iterable[ygojson.SetLocale]
 ) -> int:
@@ -521,7 +518,7 @@ def distrolen(
     return result
 
 
-@app.template_filter()
+@views.app_template_filter()
 def groupcontentsbydistro(
     set_: ygojson.Set,
 ) -> typing.Dict[
@@ -538,7 +535,7 @@ def groupcontentsbydistro(
     return result
 
 
-@app.template_filter()
+@views.app_template_filter()
 def distrolocales(
     set: ygojson.Set, contentslist: typing.List[ygojson.SetContents]
 ) -> str:
@@ -547,66 +544,98 @@ def distrolocales(
     return f" ({'/'.join({*(translatelocale(l.key) for c in contentslist for l in c.locales)})})"
 
 
-@app.template_filter()
+@views.app_template_filter()
 def flatten(xs):
     return search.flatten(xs)
 
 
-@app.template_test()
+@views.app_template_test()
 def oftypecard(thing) -> bool:
     return type(thing) == ygojson.Card
 
 
-@app.template_test()
+@views.app_template_test()
 def oftypeset(thing) -> bool:
     return type(thing) == ygojson.Set
 
 
-@app.template_test()
+@views.app_template_test()
 def oftypeseries(thing) -> bool:
     return type(thing) == ygojson.Series
 
 
-@app.template_test()
+@views.app_template_test()
 def oftypedistro(thing) -> bool:
     return type(thing) == ygojson.PackDistrobution
 
 
-@app.template_test()
+@views.app_template_test()
 def oftypeproduct(thing) -> bool:
     return type(thing) == ygojson.SealedProduct
 
 
-@app.template_test()
+@views.app_template_test()
 def specialdistro(distro) -> bool:
     return type(distro) == ygojson.SpecialDistroType
 
 
-@app.template_test()
+@views.app_template_test()
 def slotpool(thing) -> bool:
     return type(thing) == ygojson.PackDistroSlotPool
 
 
-@app.template_test()
+@views.app_template_test()
 def slotcards(thing) -> bool:
     return type(thing) == ygojson.PackDistroSlotCards
 
 
-@app.template_test()
+@views.app_template_test()
 def slotset(thing) -> bool:
     return type(thing) == ygojson.PackDistroSlotSet
 
 
 page_load_start_time = time.time()
 
+RETRY_AFTER = 5
+"""How many seconds clients should wait before retrying while the database loads."""
+
+UNGATED_ENDPOINTS = {"static", "yjviewer.healthz", "yjviewer.readyz"}
+"""Endpoints that can be served before the database has finished loading."""
+
+
+def database_loader() -> loader.DatabaseLoader:
+    return flask.current_app.extensions["yjviewer"]
+
+
+def warming_up():
+    error = database_loader().error
+    response = flask.make_response(
+        flask.render_template(
+            "warming.j2",
+            retry_after=RETRY_AFTER,
+            error_message=str(error) if error else None,
+        ),
+        503,
+    )
+    response.headers["Retry-After"] = str(RETRY_AFTER)
+    return response
+
 
-@app.before_request
+@views.before_app_request
 def before_request():
     global page_load_start_time
     page_load_start_time = time.time()
 
+    if flask.request.endpoint in UNGATED_ENDPOINTS:
+        return None
+    generation = database_loader().current
+    if generation is None:
+        return warming_up()
+    flask.g.generation = generation
+    return None
+
 
-@app.after_request
+@views.after_app_request
 def after_request(response):
     diff = time.time() - page_load_start_time
     if (
@@ -632,28 +661,30 @@ def common_template_vars():
     }
 
 
-@app.route("/")
+@views.route("/")
 def index():
     return flask.render_template(
         "index.j2",
         **common_template_vars(),
-        ygodb=ygodb,
-        cards_of_the_day=cards_of_the_day,
+        ygodb=flask.g.generation.db,
+        cards_of_the_day=flask.g.generation.cards_of_the_day,
     )
 
 
-@app.route("/random-card")
+@views.route("/random-card")
 def random_card():
-    return app.redirect(
+    ygodb = flask.g.generation.db
+    return flask.redirect(
         flask.url_for(
-            card.__name__,
+            f".{card.__name__}",
             uuid=random.choice([*ygodb.cards_by_id]),
         )
     )
 
 
-@app.route("/card/<uuid:uuid>")
+@views.route("/card/<uuid:uuid>")
 def card(uuid: uuid.UUID):
+    ygodb = flask.g.generation.db
     return flask.render_template(
         "card.j2",
         **common_template_vars(),
@@ -662,18 +693,20 @@ def card(uuid: uuid.UUID):
     )
 
 
-@app.route("/random-set")
+@views.route("/random-set")
 def random_set():
-    return app.redirect(
+    ygodb = flask.g.generation.db
+    return flask.redirect(
         flask.url_for(
-            set_.__name__,
+            f".{set_.__name__}",
             uuid=random.choice([*ygodb.sets_by_id]),
         )
     )
 
 
-@app.route("/set/<uuid:uuid>")
+@views.route("/set/<uuid:uuid>")
 def set_(uuid: uuid.UUID):
+    ygodb = flask.g.generation.db
     return flask.render_template(
         "set.j2",
         **common_template_vars(),
@@ -682,18 +715,20 @@ def set_(uuid: uuid.UUID):
     )
 
 
-@app.route("/random-series")
+@views.route("/random-series")
 def random_series():
-    return app.redirect(
+    ygodb = flask.g.generation.db
+    return flask.redirect(
         flask.url_for(
-            series.__name__,
+            f".{series.__name__}",
             uuid=random.choice([*ygodb.series_by_id]),
         )
     )
 
 
-@app.route("/series/<uuid:uuid>")
+@views.route("/series/<uuid:uuid>")
 def series(uuid: uuid.UUID):
+    ygodb = flask.g.generation.db
     return flask.render_template(
         "series.j2",
         **common_template_vars(),
@@ -702,18 +737,20 @@ def series(uuid: uuid.UUID):
     )
 
 
-@app.route("/random-product")
+@views.route("/random-product")
 def random_product():
-    return app.redirect(
+    ygodb = flask.g.generation.db
+    return flask.redirect(
         flask.url_for(
-            product.__name__,
+            f".{product.__name__}",
             uuid=random.choice([*ygodb.products_by_id]),
         )
     )
 
 
-@app.route("/product/<uuid:uuid>")
+@views.route("/product/<uuid:uuid>")
 def product(uuid: uuid.UUID):
+    ygodb = flask.g.generation.db
     return flask.render_template(
         "product.j2",
         **common_template_vars(),
@@ -722,39 +759,85 @@ def product(uuid: uuid.UUID):
     )
 
 
-@app.route("/search")
+FACET_VALUES_SHOWN = 20
+"""How many values of each facet to show on the search page."""
+
+SEARCH_TIMEOUTS: typing.Dict[str, typing.Optional[float]] = {
+    "yjviewer.search_": 10.0,
+    "yjviewer.api_search": 5.0,
+    "yjviewer.api_facets": 5.0,
+    "yjviewer.api_explain": 30.0,
+    "yjviewer.api_batch": 30.0,
+}
+"""How many seconds searches from each endpoint may take before they're stopped.
+The app's ``SEARCH_TIMEOUTS`` config overrides these, by endpoint;
+a timeout of None means searches there may take any time.
+"""
+
+
+def search_timeout() -> typing.Optional[float]:
+    """Get how long searches from the current endpoint may take."""
+    timeouts = {
+        **SEARCH_TIMEOUTS,
+        **flask.current_app.config.get("SEARCH_TIMEOUTS", {}),
+    }
+    return timeouts.get(flask.request.endpoint)
+
+
+@views.route("/search")
 def search_():
+    ygodb = flask.g.generation.db
     query = flask.request.args.get("query", "")
-    page = int(flask.request.args.get("page", "1"))
+    page = max(int(flask.request.args.get("page", "1")), 1)
     try:
-        search_ = search.Search(query)
-        results = search_.execute(ygodb)
+        search_ = search.Search(query, timeout=search_timeout())
+        results, n_results = search_.execute_page(ygodb, page)
+        facets = [
+            (
+                search.FACET_TITLES[facet],
+                [
+                    (value, count, search.facet_term(facet, value))
+                    for value, count in counts.items()
+                ],
+            )
+            for facet, counts in search_.facet_counts(
+                ygodb, search.DEFAULT_FACETS
+            ).items()
+            if counts
+        ]
         hrq = search_.human_readable_query()
+        explanation = search_.explanation
         error_msg = None
     except search.SearchFailedException as e:
-        results = []
+        results, n_results = [], 0
+        facets = []
         hrq = None
+        # If the search ran out of time, show how far it got.
+        explanation = (
+            e.explanation if isinstance(e, search.SearchTimeoutException) else None
+        )
         error_msg = str(e)
-        app.logger.exception(e)
+        flask.current_app.logger.exception(e)
 
     return flask.render_template(
         "search.j2",
         **common_template_vars(),
         ygodb=ygodb,
         query=query,
-        results=results[search.SEARCH_RESULTS_PER_PAGE * (page - 1) :][
-            : search.SEARCH_RESULTS_PER_PAGE
-        ],
-        n_results=len(results),
+        results=results,
+        n_results=n_results,
         SEARCH_RESULTS_PER_PAGE=search.SEARCH_RESULTS_PER_PAGE,
         page=page,
-        n_pages=math.ceil(len(results) / search.SEARCH_RESULTS_PER_PAGE),
+        n_pages=math.ceil(n_results / search.SEARCH_RESULTS_PER_PAGE),
+        facets=facets,
+        FACET_VALUES_SHOWN=FACET_VALUES_SHOWN,
         human_readable_query=hrq,
+        explanation=explanation,
         error_message=error_msg,
     )
 
 
-@app.route("/about")
+@views.route("/about")
 def about():
     return flask.render_template(
         "about.j2",
@@ -762,7 +845,7 @@ def about():
     )
 
 
-@app.route("/syntax")
+@views.route("/syntax")
 def syntax():
     return flask.render_template(
         "syntax.j2",
@@ -770,3 +853,292 @@ def syntax():
         FILTERS=search.FILTERS,
         SORTERS=search.SORTERS,
     )
+
+
+@views.route("/healthz")
+def healthz():
+    error = database_loader().error
+    if error:
+        return flask.jsonify({"status": "error", "error": str(error)}), 500
+    return flask.jsonify({"status": "ok"})
+
+
+@views.route("/readyz")
+def readyz():
+    loader_ = database_loader()
+    if loader_.ready:
+        return flask.jsonify({"status": "ready"})
+    if loader_.error:
+        return flask.jsonify({"status": "error", "error": str(loader_.error)}), 503
+    return (
+        flask.jsonify({"status": "loading"}),
+        503,
+        {"Retry-After": str(RETRY_AFTER)},
+    )
+
+
+@views.route("/api/stats")
+def api_stats():
+    generation = flask.g.generation
+    return flask.jsonify(
+        {
+            "generation": generation.number,
+            "result_cache": generation.index.results.stats(),
+        }
+    )
+
+
+@views.app_errorhandler(api.APIError)
+def api_error(e: api.APIError):
+    return flask.jsonify({"error": str(e), **e.data}), e.status
+
+
+@views.route("/api/search")
+def api_search():
+    """Stream search results as newline-delimited JSON, one result per line.
+    If there are more results, the X-Next-Cursor header has a cursor
+    to pass back as the "cursor" parameter to get them.
+    """
+    generation = flask.g.generation
+    args = flask.request.args
+    fields = api.parse_fields(args.get("fields"))
+    limit = api.parse_limit(args.get("limit"))
+    if "cursor" in args:
+        query, offset = api.decode_cursor(args["cursor"], generation.number)
+    else:
+        query, offset = args.get("query", ""), 0
+
+    try:
+        ids, n_results = search.Search(query, timeout=search_timeout()).execute_ids(
+            generation.db, offset, offset + limit
+        )
+    except search.SearchFailedException as e:
+        raise api.search_error(e)
+
+    index = generation.index
+
+    def lines():
+        for id in ids.tolist():
+            yield json.dumps(api.serialize(index, id, fields)) + "\n"
+
+    response = flask.Response(
+        flask.stream_with_context(lines()), mimetype="application/x-ndjson"
+    )
+    response.headers["X-Result-Count"] = str(n_results)
+    if offset + limit < n_results:
+        response.headers["X-Next-Cursor"] = api.encode_cursor(
+            generation.number, query, offset + limit
+        )
+    return response
+
+
+@views.route("/api/batch", methods=["POST"])
+def api_batch():
+    """Run many searches at once, sharing work between them.
+    Takes a JSON object with a list of "queries", and optionally "fields" and "limit"
+    as in /api/search. Returns the first results of every query, in order.
+    All of the searches share one deadline. If it passes while their shared work
+    is being done, the whole batch fails; if it passes after that,
+    the searches that didn't finish in time have an error instead of results.
+    """
+    generation = flask.g.generation
+    body = flask.request.get_json(silent=True)
+    if (
+        not isinstance(body, dict)
+        or not isinstance(body.get("queries"), list)
+        or not all(isinstance(x, str) for x in body["queries"])
+    ):
+        raise api.APIError('Expected a JSON object with a list of "queries"!')
+    queries: typing.List[str] = body["queries"]
+    if len(queries) > api.MAX_BATCH_QUERIES:
+        raise api.APIError(
+            f"Too many queries! At most {api.MAX_BATCH_QUERIES} can be run at once."
+        )
+    fields = api.parse_fields(body.get("fields"))
+    limit = api.parse_limit(body.get("limit"))
+
+    timeout = search_timeout()
+    results: typing.List[typing.Dict[str, typing.Any]] = []
+    searches: typing.Dict[int, search.Search] = {}
+    for i, query in enumerate(queries):
+        try:
+            searches[i] = search.Search(query, timeout=timeout)
+            results.append({})
+        except search.SearchFailedException as e:
+            results.append({"error": str(e)})
+    try:
+        search.prefetch_batch(generation.db, [*searches.values()])
+    except search.SearchFailedException as e:
+        raise api.search_error(e)
+
+    index = generation.index
+    for i, search_ in searches.items():
+        try:
+            ids, n_results = search_.execute_ids(generation.db, 0, limit)
+        except search.SearchFailedException as e:
+            results[i] = {"error": str(e), **api.search_error(e).data}
+            continue
+        results[i] = {
+            "count": n_results,
+            "results": [api.serialize(index, id, fields) for id in ids.tolist()],
+        }
+    return flask.jsonify({"results": results})
+
+
+@views.route("/api/facets")
+def api_facets():
+    """Count the results of a search by every facet in the "facets" parameter."""
+    generation = flask.g.generation
+    facets = api.parse_facets(flask.request.args.get("facets"))
+    try:
+        search_ = search.Search(
+            flask.request.args.get("query", ""), timeout=search_timeout()
+        )
+        counts = search_.facet_counts(generation.db, facets)
+    except search.SearchFailedException as e:
+        raise api.search_error(e)
+    return flask.jsonify({"facets": counts})
+
+
+@views.route("/api/explain")
+def api_explain():
+    """Run a search, and report how long every step took and how many things
+    went into and came out of each.
+    """
+    generation = flask.g.generation
+    try:
+        search_ = search.Search(
+            flask.request.args.get("query", ""),
+            explain=True,
+            timeout=search_timeout(),
+        )
+        # Sort a page's worth of results, so that the sort is explained too.
+        _, n_results = search_.execute_ids(
+            generation.db, 0, search.SEARCH_RESULTS_PER_PAGE
+        )
+    except search.SearchFailedException as e:
+        raise api.search_error(e)
+    return flask.jsonify(
+        {"count": n_results, "explanation": search_.explanation.to_json()}
+    )
+
+
+@views.route("/api/suggest")
+def api_suggest():
+    """Suggest names that start with what the user has typed so far."""
+    generation = flask.g.generation
+    args = flask.request.args
+    prefix = args.get("q", "").strip().lower()
+    language = api.parse_language(args.get("lang"))
+    limit = api.parse_limit(
+        args.get("limit"), searchindex.SUGGESTIONS, api.MAX_SUGGESTIONS
+    )
+    index = generation.index
+    if not prefix or language not in index.prefixes:
+        return flask.jsonify([])
+    return flask.jsonify(
+        [
+            {
+                "name": api.names(index.things[id])[language],
+                **api.serialize(index, id, ["id", "class", "url"]),
+            }
+            for id in index.prefixes[language].search(prefix, limit).tolist()
+        ]
+    )
+
+
+@views.cli.command("build-snapshot")
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Rebuild the snapshot even if it is already up to date.",
+)
+def build_snapshot(force: bool):
+    """Build the pre-linked database snapshot from the aggregate JSON files."""
+    loader_ = database_loader()
+    loader_.wait()
+    if loader_.error or loader_.current is None:
+        raise click.ClickException(f"Loading the database failed: {loader_.error}")
+    aggregates_dir = loader_.aggregates_dir
+    path = snapshot.snapshot_path(aggregates_dir)
+    if force:
+        # Save the database that was just loaded, rather than loading it again.
+        try:
+            snapshot.save_snapshot(loader_.current.db, aggregates_dir)
+        except Exception as e:
+            raise click.ClickException(f"Writing snapshot {path} failed: {e}")
+    # Loading the database only logs failures to write the snapshot.
+    if not snapshot.snapshot_is_fresh(aggregates_dir):
+        raise click.ClickException(
+            f"Snapshot {path} could not be written; see the log for why."
+        )
+    click.echo(f"Snapshot {path} is up to date.")
+
+
+@views.cli.command("benchmark")
+@click.option(
+    "--scale",
+    "scales",
+    type=float,
+    multiple=True,
+    default=[10.0],
+    show_default=True,
+    help="Also benchmark a made-up database this many times as big as the real one. Can be given more than once.",
+)
+@click.option(
+    "--repeat",
+    type=int,
+    default=benchmark.REPEAT,
+    show_default=True,
+    help="How many times to run every benchmark.",
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="Where to write the results, as JSON. Defaults to standard output.",
+)
+@click.option(
+    "--compare",
+    "baseline",
+    type=click.File("r"),
+    help="Results from an earlier run to compare these to.",
+)
+def benchmark_(
+    scales: typing.List[float],
+    repeat: int,
+    output: typing.TextIO,
+    baseline: typing.Optional[typing.TextIO],
+):
+    """Benchmark searching the real database and made-up bigger ones."""
+    loader_ = database_loader()
+    loader_.wait()
+    if loader_.error or loader_.current is None:
+        raise click.ClickException(f"Loading the database failed: {loader_.error}")
+    db = loader_.current.db
+
+    databases = [benchmark.run(db, "real", repeat)]
+    for scale in scales:
+        click.echo(f"Benchmarking a database {scale:g} times as big...", err=True)
+        databases.append(
+            benchmark.run(
+                synthetic.scaled_database(db, scale), f"synthetic-{scale:g}x", repeat
+            )
+        )
+    results = benchmark.report(databases)
+    json.dump(results, output, indent=2)
+    output.write("\n")
+    if baseline is not None:
+        for line in benchmark.compare(json.load(baseline), results):
+            click.echo(line, err=True)
+
+
+def create_app(aggregates_dir: str = ygojson.AGGREGATE_DIR) -> flask.Flask:
+    app = flask.Flask(__name__)
+    # Lets YJVIEWER_SEARCH_TIMEOUTS='{"yjviewer.api_search": 2}' and the like
+    # configure the app from the environment.
+    app.config.from_prefixed_env("YJVIEWER")
+    app.register_blueprint(views)
+    app.extensions["yjviewer"] = loader.DatabaseLoader(aggregates_dir)
+    app.extensions["yjviewer"].start()
+    return app
@@ -0,0 +1,201 @@
+import base64
+import json
+import typing
+
+import flask
+import ygojson
+
+from . import search, searchindex
+from .searchindex import Thing
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+MAX_SUGGESTIONS = 50
+MAX_BATCH_QUERIES = 1000
+
+CLASS_ENDPOINTS: typing.Dict[typing.Type, str] = {
+    ygojson.Card: "yjviewer.card",
+    ygojson.Set: "yjviewer.set_",
+    ygojson.SealedProduct: "yjviewer.product",
+    ygojson.Series: "yjviewer.series",
+}
+
+
+class APIError(Exception):
+    """An error to report to an API client, as JSON."""
+
+    status: int
+    data: typing.Dict[str, typing.Any]
+    """Anything else to tell the client, alongside the error message."""
+
+    def __init__(self, message: str, status: int = 400, **data: typing.Any) -> None:
+        super().__init__(message)
+        self.status = status
+        self.data = data
+
+
+def search_error(e: search.SearchFailedException) -> APIError:
+    """Report a failed search to the client.
+    Searches that ran out of time are reported with a 503,
+    along with how far they got if they were being explained.
+    """
+    if isinstance(e, search.SearchTimeoutException):
+        if e.explanation is None:
+            return APIError(str(e), 503, timed_out=True)
+        return APIError(
+            str(e), 503, timed_out=True, explanation=e.explanation.to_json()
+        )
+    return APIError(str(e))
+
+
+def names(thing: Thing) -> typing.Dict[ygojson.Language, str]:
+    if type(thing) is ygojson.Card:
+        return {k: v.name for k, v in thing.text.items()}
+    return thing.name
+
+
+def name(thing: Thing) -> typing.Optional[str]:
+    """The English name of a thing, or any name if it has no English one."""
+    result = names(thing)
+    if ygojson.Language.ENGLISH in result:
+        return result[ygojson.Language.ENGLISH]
+    return next(iter(result.values()), None)
+
+
+def _stat(stat: str) -> "Field":
+    def get(index: searchindex.SearchIndex, id: int) -> typing.Union[None, int, str]:
+        value = index.stats[stat][id]
+        if value == searchindex.MISSING:
+            return None
+        if value == searchindex.UNKNOWN:
+            return "?"
+        return int(value)
+
+    return get
+
+
+def _typeline(
+    index: searchindex.SearchIndex, id: int
+) -> typing.Optional[typing.List[str]]:
+    thing = index.things[id]
+    if type(thing) is not ygojson.Card:
+        return None
+    return [x for x in searchindex.typeline(thing) if x]
+
+
+def _attribute(index: searchindex.SearchIndex, id: int) -> typing.Optional[str]:
+    thing = index.things[id]
+    if type(thing) is not ygojson.Card or not thing.attribute:
+        return None
+    return thing.attribute.value
+
+
+def _date(index: searchindex.SearchIndex, id: int) -> typing.Optional[str]:
+    date = index.release_dates.date(id)
+    return date.isoformat() if date else None
+
+
+Field = typing.Callable[[searchindex.SearchIndex, int], typing.Any]
+
+FIELDS: typing.Dict[str, Field] = {
+    "id": lambda index, id: str(index.things[id].id),
+    "class": lambda index, id: searchindex.CLASS_NAMES[type(index.things[id])],
+    "name": lambda index, id: name(index.things[id]),
+    "names": lambda index, id: {k.value: v for k, v in names(index.things[id]).items()},
+    "url": lambda index, id: flask.url_for(
+        CLASS_ENDPOINTS[type(index.things[id])], uuid=index.things[id].id
+    ),
+    "date": _date,
+    **{k: _stat(k) for k in searchindex.STATS},
+    "type": _typeline,
+    "attribute": _attribute,
+}
+"""Everything API clients can ask for about a search result."""
+
+DEFAULT_FIELDS = ["id", "class", "name"]
+
+
+def parse_fields(fields: typing.Optional[str]) -> typing.List[str]:
+    """Parse a comma-separated list of field names."""
+    if not fields:
+        return DEFAULT_FIELDS
+    result = [x.strip() for x in fields.split(",") if x.strip()]
+    for field in result:
+        if field not in FIELDS:
+            raise APIError(
+                f"Unknown field '{field}'! Known fields are: {', '.join(FIELDS)}."
+            )
+    return result
+
+
+def parse_facets(facets: typing.Optional[str]) -> typing.List[str]:
+    """Parse a comma-separated list of facet names."""
+    if not facets:
+        return search.DEFAULT_FACETS
+    result = [x.strip() for x in facets.split(",") if x.strip()]
+    for facet in result:
+        if facet not in searchindex.FACETS:
+            raise APIError(
+                f"Unknown facet '{facet}'! Known facets are: {', '.join(searchindex.FACETS)}."
+            )
+    return result
+
+
+def parse_limit(
+    limit: typing.Optional[str],
+    default: int = API_PAGE_SIZE,
+    maximum: int = API_MAX_PAGE_SIZE,
+) -> int:
+    if not limit:
+        return default
+    try:
+        result = int(limit)
+    except ValueError:
+        raise APIError(f"Limit '{limit}' is not a number!")
+    return max(1, min(result, maximum))
+
+
+def parse_language(language: typing.Optional[str]) -> ygojson.Language:
+    if not language:
+        return ygojson.Language.ENGLISH
+    try:
+        return ygojson.Language(language)
+    except ValueError:
+        raise APIError(f"Unknown language '{language}'!")
+
+
+def serialize(
+    index: searchindex.SearchIndex, id: int, fields: typing.List[str]
+) -> typing.Dict[str, typing.Any]:
+    return {field: FIELDS[field](index, id) for field in fields}
+
+
+def encode_cursor(generation: int, query: str, offset: int) -> str:
+    """Make a cursor for continuing a search from the given offset.
+    Cursors only work with the database generation they were made in,
+    so that the results don't shift under a client that is paging through them.
+    """
+    data = json.dumps([generation, query, offset], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, generation: int) -> typing.Tuple[str, int]:
+    """Get the query and offset a cursor continues from."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_generation, query, offset = json.loads(data)
+        if (
+            type(cursor_generation) is not int
+            or type(query) is not str
+            or type(offset) is not int
+            or offset < 0
+        ):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise APIError("Invalid cursor!")
+    if cursor_generation != generation:
+        raise APIError(
+            "This cursor has expired, because the database has been reloaded since it was made. Please restart your search.",
+            410,
+        )
+    return query, offset
@@ -0,0 +1,156 @@
+import datetime
+import platform
+import statistics
+import time
+import typing
+
+import numpy
+import ygojson
+
+from . import search, searchindex
+from .version import __version__
+
+REPEAT = 5
+NESTING_DEPTHS = [1, 4, 16, 64]
+SORT_QUERY = ":card"
+"""What sorts are benchmarked on: something with lots of results."""
+COMPARE_QUERY_LENGTH = 40
+
+FILTER_QUERIES: typing.Dict[typing.Type[search.Filter], typing.List[str]] = {
+    search.FilterName: [
+        "name:dragon",
+        "name=kuriboh",
+        'name:"blue eyes white"',
+        'name~"dark magican"',
+        "name~/^dark.*magician$/",
+    ],
+    search.FilterEffect: [
+        "effect:destroy",
+        'effect:"special summon"',
+        "effect~/banish.*face-down/",
+    ],
+    search.FilterClass: [":card", ":set"],
+    search.FilterType: ["type:spell", "type=dragon"],
+    search.FilterAttribute: ["attribute:dark"],
+    search.FilterATK: ["atk>=2500", "atk:?"],
+    search.FilterDEF: ["def<1000"],
+    search.FilterLevel: ["level:4"],
+    search.FilterRank: ["rank>=4"],
+    search.FilterScale: ["scale:1"],
+    search.FilterLinkRating: ["link>=3"],
+    search.FilterDateOfRelease: ["date>=2010-01-01"],
+}
+"""Queries for every filter in `search.FILTERS`, in the modes it accepts."""
+
+
+def nested_query(depth: int) -> str:
+    """Make a query with NOTs and ORs nested `depth` deep."""
+    query = "dark|dragon"
+    for i in range(depth):
+        query = f"-({query}|atk>={i * 100})"
+    return query
+
+
+def cases() -> typing.List[typing.Tuple[str, str, str]]:
+    """Get the group, name and query of every benchmark."""
+    result = []
+    for filter in dict.fromkeys(search.FILTERS):
+        if filter not in FILTER_QUERIES:
+            raise KeyError(f"No benchmark queries for filter {filter.__name__}!")
+        result.extend(("filter", filter.__name__, x) for x in FILTER_QUERIES[filter])
+    for sorter in search.SORTERS:
+        for direction in ["asc", "desc"]:
+            query = f"{SORT_QUERY} sort:{sorter.names[0]}-{direction}"
+            result.append(("sort", sorter.__name__, query))
+    for depth in NESTING_DEPTHS:
+        result.append(("nesting", f"depth {depth}", nested_query(depth)))
+    return result
+
+
+def time_search(
+    db: ygojson.Database, query: str, repeat: int = REPEAT
+) -> typing.Dict[str, typing.Any]:
+    """Time getting the first page of results of a query, with nothing cached."""
+    index = searchindex.get_index(db)
+    times = []
+    for _ in range(repeat):
+        index.clear_caches()
+        search.parse_query.cache_clear()
+        searchindex.regex_pattern.cache_clear()
+        start = time.perf_counter()
+        _, n_results = search.Search(query).execute_ids(
+            db, 0, search.SEARCH_RESULTS_PER_PAGE
+        )
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "results": n_results,
+        "min_ms": round(min(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "mean_ms": round(statistics.mean(times), 3),
+    }
+
+
+def run(
+    db: ygojson.Database, name: str, repeat: int = REPEAT
+) -> typing.Dict[str, typing.Any]:
+    """Run every benchmark against a database."""
+    # The searches below use the index timed here.
+    start = time.perf_counter()
+    searchindex.build_index(db)
+    index_ms = (time.perf_counter() - start) * 1000
+    return {
+        "database": name,
+        "cards": len(db.cards),
+        "sets": len(db.sets),
+        "products": len(db.products),
+        "series": len(db.series),
+        "index_ms": round(index_ms, 3),
+        "cases": [
+            {
+                "group": group,
+                "name": case_name,
+                "query": query,
+                **time_search(db, query, repeat),
+            }
+            for group, case_name, query in cases()
+        ],
+    }
+
+
+def report(
+    databases: typing.List[typing.Dict[str, typing.Any]]
+) -> typing.Dict[str, typing.Any]:
+    """Wrap the results of `run` with what they were run on."""
+    return {
+        "yjviewer": __version__,
+        "ygojson": ygojson.__version__,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "time": datetime.datetime.now().isoformat(),
+        "databases": databases,
+    }
+
+
+def compare(
+    old: typing.Dict[str, typing.Any], new: typing.Dict[str, typing.Any]
+) -> typing.List[str]:
+    """Describe how the median time of every benchmark in both reports changed."""
+    old_cases = {
+        (database["database"], case["query"]): case
+        for database in old["databases"]
+        for case in database["cases"]
+    }
+    lines = []
+    for database in new["databases"]:
+        for case in database["cases"]:
+            old_case = old_cases.get((database["database"], case["query"]))
+            if old_case is None:
+                continue
+            before, after = old_case["median_ms"], case["median_ms"]
+            query = case["query"]
+            if len(query) > COMPARE_QUERY_LENGTH:
+                query = query[: COMPARE_QUERY_LENGTH - 3] + "..."
+            lines.append(
+                f"{database['database']}: {case['group']} {case['name']}: {query}: {before:.3f}ms -> {after:.3f}ms ({after / max(before, 0.001):.2f}x)"
+            )
+    return lines
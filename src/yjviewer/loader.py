@@ -0,0 +1,142 @@
+import logging
+import os
+import random
+import threading
+import time
+import typing
+
+import ygojson
+
+from . import searchindex, snapshot
+
+logger = logging.getLogger(__name__)
+
+N_CARDS_OF_THE_DAY = 5
+
+WATCH_INTERVAL = 2.0
+"""How many seconds to wait between checks for new aggregate files.
+Files have to stay the same for a whole interval before they are loaded,
+so changes are noticed two to three intervals after they are made.
+Checking only looks at the files' sizes and modification times, so it's cheap.
+"""
+
+
+class Generation:
+    """One loaded copy of the database, along with everything derived from it.
+    A generation is never modified once it is built;
+    reloading the database builds a new generation and swaps it in.
+    """
+
+    number: int
+    db: ygojson.Database
+    index: searchindex.SearchIndex
+    cards_of_the_day: typing.List[ygojson.Card]
+
+    def __init__(self, number: int, db: ygojson.Database) -> None:
+        self.number = number
+        self.db = db
+        self.index = searchindex.get_index(db)
+
+        portenial_cotd = [x for x in db.cards if x.images and x.images[0].card_art]
+        self.cards_of_the_day = [
+            random.choice(portenial_cotd) for i in range(N_CARDS_OF_THE_DAY)
+        ]
+
+
+class DatabaseLoader:
+    """Loads the database on a background thread, so the app can serve requests
+    (such as health checks) while the database is still loading.
+    Afterwards, it watches the aggregate files, and when they change,
+    it loads them into a new generation and swaps that in.
+    Requests already running keep the generation they started with.
+    """
+
+    aggregates_dir: str
+    watch_interval: typing.Optional[float]
+    current: typing.Optional[Generation]
+    error: typing.Optional[BaseException]
+
+    def __init__(
+        self,
+        aggregates_dir: str,
+        watch_interval: typing.Optional[float] = WATCH_INTERVAL,
+    ) -> None:
+        self.aggregates_dir = aggregates_dir
+        self.watch_interval = watch_interval
+        self.current = None
+        self.error = None
+        self._thread: typing.Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._loaded_stats: typing.Optional[typing.Dict[str, typing.Any]] = None
+        self._changed_stats: typing.Optional[typing.Dict[str, typing.Any]] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.current is not None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="yjviewer-loader", daemon=True
+            )
+            self._thread.start()
+
+    def wait(self, timeout: typing.Optional[float] = None) -> bool:
+        """Wait for the first load to finish, successfully or not.
+        Returns False if the timeout ran out first.
+        """
+        self.start()
+        return self._done.wait(timeout)
+
+    def _run(self) -> None:
+        try:
+            self._load()
+        finally:
+            self._done.set()
+
+        if self.watch_interval is None:
+            return
+        while True:
+            time.sleep(self.watch_interval)
+            try:
+                self._poll()
+            except Exception:
+                logger.exception("Checking for database changes failed")
+
+    def _load(self) -> None:
+        stats = (
+            snapshot.aggregate_stats(self.aggregates_dir)
+            if os.path.exists(self.aggregates_dir)
+            else None
+        )
+        try:
+            db = snapshot.load_database(self.aggregates_dir)
+            if stats is None:
+                stats = snapshot.aggregate_stats(self.aggregates_dir)
+            number = self.current.number + 1 if self.current else 1
+            self.current = Generation(number, db)
+            self.error = None
+            logger.info(f"Loaded database generation {number}")
+        except BaseException as e:
+            logger.exception("Loading the database failed")
+            if self.current is None:
+                self.error = e
+        # Even if loading failed, don't retry until the files change again.
+        self._loaded_stats = stats
+
+    def _poll(self) -> None:
+        stats = snapshot.aggregate_stats(self.aggregates_dir)
+        if stats == self._loaded_stats:
+            self._changed_stats = None
+            return
+        if stats != self._changed_stats:
+            # The files may still be being written;
+            # wait until they stay the same for a whole interval.
+            self._changed_stats = stats
+            return
+        self._changed_stats = None
+        logger.info(f"Aggregates in {self.aggregates_dir} changed; reloading")
+        self._load()
@@ -1,24 +1,52 @@
+import collections
 import datetime
 import enum
+import functools
 import math
+import operator
 import os
-import sys
+import time
 import typing
 
 import lark
+import numpy
 import ygojson
 
+from . import searchindex
 from .locales import LOCALE_TRANSLATED
+from .searchindex import Thing
 
 SEARCH_RESULTS_PER_PAGE = 100
 
-Thing = typing.Union[ygojson.Card, ygojson.Set, ygojson.Series, ygojson.SealedProduct]
+INDEX_COST = 0.01
+"""The planning cost of filters that are answered from the search index."""
+VERIFY_COST = 0.1
+"""The planning cost of filters whose index candidates are checked one by one."""
+FUZZY_COST = 0.5
+"""The planning cost of fuzzy name filters, which can't be narrowed down by
+earlier terms, since their relevance needs distances for every thing.
+"""
+REGEX_COST = 1.0
+"""The planning cost of regular expression filters."""
 
 
 class SearchFailedException(Exception):
     pass
 
 
+class SearchTimeoutException(SearchFailedException):
+    """A search took longer than its timeout, and was stopped."""
+
+    explanation: typing.Optional["Explanation"]
+    """How far the search got, if it was being explained."""
+
+    def __init__(
+        self, message: str, explanation: typing.Optional["Explanation"] = None
+    ) -> None:
+        super().__init__(message)
+        self.explanation = explanation
+
+
 class SortDir(enum.Enum):
     ASC = 0
     DESC = 1
@@ -29,9 +57,10 @@ class Sorter:
     desc: typing.ClassVar[str]
 
     @classmethod
-    def execute(
-        cls, search: "Search", db: ygojson.Database, result: Thing, dir: SortDir
-    ) -> typing.Any:
+    def keys(
+        cls, search: "Search", db: ygojson.Database
+    ) -> typing.List[searchindex.SortKey]:
+        """Get the keys to sort by, most significant first."""
         raise NotImplementedError
 
     @classmethod
@@ -47,10 +76,10 @@ class Sort:
         self.sorter = sorter
         self.dir = dir
 
-    def execute(
-        self, db: ygojson.Database, search: "Search", result: Thing
-    ) -> typing.Any:
-        return self.sorter.execute(search, db, result, self.dir)
+    def ranks(
+        self, db: ygojson.Database, search: "Search"
+    ) -> typing.List[numpy.ndarray]:
+        return [key[self.dir == SortDir.DESC] for key in self.sorter.keys(search, db)]
 
     def human_readable_query(self, search: "Search") -> str:
         if self.dir == SortDir.ASC:
@@ -66,31 +95,188 @@ class FilterMode(enum.Enum):
     LE = "<="
     GT = ">"
     GE = ">="
+    FUZZY = "~"
+    REGEX = "~/"
+    """A regular expression, written ``~/pattern/``."""
 
 
 class Filter:
+    """Subclasses must override `match`."""
+
     names: typing.ClassVar[typing.List[str]]
     desc: typing.ClassVar[str]
+    modes: typing.ClassVar[typing.Collection[FilterMode]] = [
+        FilterMode.DEFAULT,
+        FilterMode.EQ,
+        FilterMode.LT,
+        FilterMode.LE,
+        FilterMode.GT,
+        FilterMode.GE,
+    ]
+    cost: typing.ClassVar[float] = 1.0
+    """Roughly how long this filter takes per thing checked,
+    relative to other filters. Used for planning searches.
+    """
 
     @classmethod
-    def execute(
+    def compile(cls, mode: FilterMode, value: str) -> typing.Any:
+        """Check a predicate and parse its value. This is done once,
+        when the query is parsed, so that invalid predicates fail the parse.
+        The result is stored in `TermPredicate.compiled`.
+        By default, this checks the mode and normalizes the value.
+        """
+        if mode == FilterMode.REGEX and mode not in cls.modes:
+            raise SearchFailedException(
+                f"Search filter '{cls.names[0]}' does not accept regular expressions!"
+            )
+        if mode not in cls.modes:
+            raise SearchFailedException(
+                f"Search filter '{cls.names[0]}' does not accept filter mode '{mode.value}'!"
+            )
+        return value.strip().lower()
+
+    @classmethod
+    def estimate(
+        cls, db: ygojson.Database, search: "Search", predicate: "TermPredicate"
+    ) -> float:
+        """Estimate what fraction of all things match the predicate.
+        This must be fast.
+        """
+        return 1.0
+
+    @classmethod
+    def predicate_cost(cls, predicate: "TermPredicate") -> float:
+        """Get the planning cost of a predicate. By default, this is `cost`;
+        filters whose modes differ in cost should override this.
+        """
+        return cls.cost
+
+    @classmethod
+    def match(
         cls,
         db: ygojson.Database,
         search: "Search",
         predicate: "TermPredicate",
-        results: typing.Iterable[Thing],
-    ) -> typing.Iterable[Thing]:
+        within: searchindex.Bits,
+    ) -> searchindex.Bits:
+        """Get which of the things in `within` match the predicate."""
         raise NotImplementedError
 
+    @classmethod
+    def match_many(
+        cls,
+        db: ygojson.Database,
+        search: "Search",
+        predicates: typing.List["TermPredicate"],
+    ) -> typing.List[searchindex.Bits]:
+        """Get which of all things match each of many predicates with this filter.
+        Used for batches of searches; filters that can share work
+        between predicates should override this.
+        """
+        everything = searchindex.get_index(db).everything()
+        return [cls.match(db, search, x, everything) for x in predicates]
+
+    @classmethod
+    def relevance(
+        cls, db: ygojson.Database, search: "Search", predicate: "TermPredicate"
+    ) -> typing.Optional[numpy.ndarray]:
+        """Get how closely every thing matching the predicate matches it,
+        as non-negative integers where lower is closer,
+        or None if every match is as good as any other.
+        """
+        return None
+
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
         raise NotImplementedError
 
 
+class Explanation:
+    """How one step of an explained search went."""
+
+    step: str
+    input: int
+    """How many things went into this step."""
+    output: typing.Optional[int]
+    """How many things came out of this step, or None if it was stopped."""
+    estimate: typing.Optional[int]
+    """How many things the planner expected to come out of this step."""
+    seconds: float
+    children: typing.List["Explanation"]
+
+    def __init__(
+        self, step: str, input: int, estimate: typing.Optional[int] = None
+    ) -> None:
+        self.step = step
+        self.input = input
+        self.output = None
+        self.estimate = estimate
+        self.seconds = 0.0
+        self.children = []
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "step": self.step,
+            "input": self.input,
+            "output": self.output,
+            "estimate": self.estimate,
+            "ms": round(self.seconds * 1000, 3),
+            "children": [x.to_json() for x in self.children],
+        }
+
+
+def _count(things: numpy.ndarray) -> int:
+    """Count the things in a set of `searchindex.Bits` or `searchindex.Ids`."""
+    if things.dtype == numpy.bool_:
+        return int(numpy.count_nonzero(things))
+    return len(things)
+
+
 class Term:
-    def execute(
-        self, db: ygojson.Database, search: "Search", results: typing.Iterable[Thing]
-    ) -> typing.Iterable[Thing]:
+    def evaluate(
+        self, db: ygojson.Database, search: "Search", within: searchindex.Bits
+    ) -> searchindex.Bits:
+        """Match this term, recording how it went if the search is being explained."""
+        search.check_deadline()
+        if not search.explaining:
+            return self.match(db, search, within)
+        _, selectivity = self.estimate(db, search)
+        n = len(searchindex.get_index(db).things)
+        return search.explain_step(
+            self.label(),
+            within,
+            lambda: self.match(db, search, within),
+            round(selectivity * n),
+        )
+
+    def match(
+        self, db: ygojson.Database, search: "Search", within: searchindex.Bits
+    ) -> searchindex.Bits:
+        """Get which of the things in `within` match this term."""
+        raise NotImplementedError
+
+    def estimate(
+        self, db: ygojson.Database, search: "Search"
+    ) -> typing.Tuple[float, float]:
+        """Estimate the cost of this term per thing checked,
+        and what fraction of all things it matches.
+        """
+        raise NotImplementedError
+
+    def canonical(self) -> typing.Hashable:
+        """Get a value that is equal for terms that always match the same things,
+        even if they were written differently.
+        """
+        raise NotImplementedError
+
+    def relevance(
+        self, db: ygojson.Database, search: "Search"
+    ) -> typing.Optional[numpy.ndarray]:
+        """Get how closely every thing matches this term; see `Filter.relevance`."""
+        return None
+
+    def label(self) -> str:
+        """Describe this term briefly, for explaining searches."""
         raise NotImplementedError
 
     def human_readable_query(self, search: "Search") -> str:
@@ -107,10 +293,40 @@ def flatten(xs):
 
 SORT_FILTER = "sort"
 LOCALE_FILTER = "locale"
+EXPLAIN_FILTER = "explain"
+
+
+class ParsedQuery:
+    terms: typing.List[Term]
+    sorts: typing.List[Sort]
+    sorts_given: bool
+    locales: typing.Set[ygojson.Locale]
+    explain: bool
+
+    def __init__(self) -> None:
+        self.terms = []
+        self.sorts = []
+        self.sorts_given = False
+        self.locales = set()
+        self.explain = False
+
+
+class Regex(str):
+    """A word written as ``/pattern/``, without the slashes."""
+
+
+def _filter_mode(cmpop: str, word: str) -> FilterMode:
+    if isinstance(word, Regex):
+        if cmpop != FilterMode.FUZZY.value:
+            raise SearchFailedException(
+                f"Regular expressions like '/{word}/' can only be used with '~', not '{cmpop}'!"
+            )
+        return FilterMode.REGEX
+    return FilterMode(cmpop)
 
 
 class QueryParser(lark.Transformer):
-    def __init__(self, search: "Search") -> None:
+    def __init__(self, search: ParsedQuery) -> None:
         super().__init__(True)
         self.search = search
 
@@ -119,11 +335,13 @@ class QueryParser(lark.Transformer):
 
     def predicate_simple(self, data) -> typing.Any:
         (word,) = data
+        if isinstance(word, Regex):
+            return TermPredicate(FilterName, FilterMode.REGEX, str(word))
         return TermPredicate(FilterName, FilterMode.DEFAULT, word)
 
     def predicate_class(self, data) -> typing.Any:
         (cmpop, word) = data
-        return TermPredicate(FilterClass, FilterMode(cmpop), word)
+        return TermPredicate(FilterClass, _filter_mode(cmpop, word), str(word))
 
     def predicate_full(self, data) -> typing.Any:
         (filtername, cmpop, word) = data
@@ -156,6 +374,15 @@ class QueryParser(lark.Transformer):
             self.search.sorts.append(Sort(SORTER_NAME_MAP[sortername], dir_))
             return []
 
+        if filtername_normalized == EXPLAIN_FILTER:
+            value = word.strip().lower()
+            if value not in {"true", "false"}:
+                raise SearchFailedException(
+                    f"Search filter 'explain' only accepts 'true' or 'false', not '{word}'!"
+                )
+            self.search.explain = value == "true"
+            return []
+
         if filtername_normalized == LOCALE_FILTER:
             try:
                 self.search.locales.add(ygojson.Locale.normalize(word.strip().lower()))
@@ -166,7 +393,9 @@ class QueryParser(lark.Transformer):
         if filtername_normalized not in FILTER_NAME_MAP:
             raise SearchFailedException(f"Unknown filter '{filtername}'!")
         return TermPredicate(
-            FILTER_NAME_MAP[filtername_normalized], FilterMode(cmpop), word
+            FILTER_NAME_MAP[filtername_normalized],
+            _filter_mode(cmpop, word),
+            str(word),
         )
 
     def parens(self, data) -> typing.Any:
@@ -184,33 +413,87 @@ class QueryParser(lark.Transformer):
     def ESCAPED_STRING(self, token) -> typing.Any:
         return str(token)[1:-1]
 
+    def REGEX(self, token) -> typing.Any:
+        return Regex(str(token)[1:-1])
+
+    def FILTER_NAME(self, token) -> typing.Any:
+        if token.startswith('"'):
+            return str(token)[1:-1]
+        return str(token)
+
+
+PARSE_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_query(query: str) -> ParsedQuery:
+    """Parse a query. The result is cached, so it must not be modified."""
+    result = ParsedQuery()
+    try:
+        tree = LANGUAGE.parse(query)
+        # print(tree.pretty())
+        QueryParser(result).transform(tree)
+    except lark.exceptions.VisitError as e:
+        if type(e.orig_exc) is SearchFailedException:
+            raise e.orig_exc
+        else:
+            raise
+    except (lark.exceptions.LexError, lark.exceptions.ParseError) as e:
+        raise SearchFailedException(f"{e}")
+
+    result.sorts_given = bool(result.sorts)
+    if not result.sorts:
+        result.sorts = [Sort(SorterClass, SortDir.ASC), Sort(SorterName, SortDir.ASC)]
+    return result
+
 
 class Search:
     query: str
     terms: typing.List[Term]
     sorts: typing.List[Sort]
     locales: typing.Set[ygojson.Locale]
+    """The locales to search names and text in.
+    If the query doesn't give any, this is English and Japanese.
+    """
+    filters_locales: bool
+    """Whether the query gave locales, and so only things in them are found."""
+    sorts_given: bool
+    """Whether the query gave sorts, or `sorts` is the default."""
+    explain: bool
+    """Whether to record how executing this search goes, in `explanation`."""
+    explanation: typing.Optional[Explanation]
+    """How executing this search last went, if it's being explained."""
+    timeout: typing.Optional[float]
+    """How many seconds this search may take, or None if it may take any time."""
+    deadline: typing.Optional[float]
+    """The `time.perf_counter` value this search must be done by."""
+    prefetched: typing.Dict[typing.Hashable, searchindex.Bits]
+    """Which things match predicates already matched for a batch of searches,
+    by `Term.canonical`; see `prefetch_batch`.
+    """
 
-    def __init__(self, query: str) -> None:
+    def __init__(
+        self,
+        query: str,
+        explain: bool = False,
+        timeout: typing.Optional[float] = None,
+    ) -> None:
         self.query = query
-        self.terms = []
-        self.sorts = []
-        self.locales = set()
-
-        try:
-            tree = LANGUAGE.parse(query)
-            # print(tree.pretty())
-            QueryParser(self).transform(tree)
-        except lark.exceptions.VisitError as e:
-            if type(e.orig_exc) is SearchFailedException:
-                raise e.orig_exc
-            else:
-                raise
-        except (lark.exceptions.LexError, lark.exceptions.ParseError) as e:
-            raise SearchFailedException(f"{e}")
-
-        if not self.sorts:
-            self.sorts = [Sort(SorterClass, SortDir.ASC), Sort(SorterName, SortDir.ASC)]
+        self.timeout = timeout
+        self.deadline = None if timeout is None else time.perf_counter() + timeout
+        self.prefetched = {}
+        parsed = parse_query(query)
+        self.explain = explain or parsed.explain
+        self.explanation = None
+        self._steps: typing.List[Explanation] = []
+        self.terms = [*parsed.terms]
+        self.sorts = [*parsed.sorts]
+        self.sorts_given = parsed.sorts_given
+        self.filters_locales = bool(parsed.locales)
+        self.locales = {*parsed.locales} or {
+            ygojson.Locale.ENGLISH,
+            ygojson.Locale.JAPANESE,
+        }
 
     def human_readable_query(self) -> str:
         result = "all things"
@@ -229,57 +512,244 @@ class Search:
             )
         return result
 
-    def _exclude_cards_out_of_locale(
-        self, results: typing.Iterable[ygojson.Card]
-    ) -> typing.Iterable[ygojson.Card]:
-        if not self.locales:
-            yield from results
-            return
-        for result in results:
-            if any(l in result.text and result.text[l].official for l in self.locales):
-                yield result
-
-    def _exclude_sets_out_of_locale(
-        self, results: typing.Iterable[typing.Union[ygojson.Set, ygojson.SealedProduct]]
-    ) -> typing.Iterable[typing.Union[ygojson.Set, ygojson.SealedProduct]]:
-        if not self.locales:
-            yield from results
-            return
-        for result in results:
-            if any(l in result.locales for l in self.locales):
-                yield result
-
-    def _exclude_series_out_of_locale(
-        self, results: typing.Iterable[ygojson.Series]
-    ) -> typing.Iterable[ygojson.Series]:
-        if not self.locales:
-            yield from results
-            return
-        for result in results:
-            if any(l in result.name for l in self.locales):
-                yield result
+    def check_deadline(self) -> None:
+        """Stop this search if it has run out of time.
+        Every step of a search calls this, as do slow index lookups as they go
+        (see `searchindex.DeadlineCheck`), so that expensive searches
+        give up instead of holding on to a worker.
+        """
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeoutException(
+                f"This search was too expensive, and was stopped after {self.timeout:g} seconds! Try making it simpler or more specific.",
+                self.explanation,
+            )
 
-    def execute(self, db: ygojson.Database) -> typing.List[Thing]:
-        results = [
-            *self._exclude_cards_out_of_locale(db.cards),
-            *self._exclude_sets_out_of_locale(db.sets),
-            *self._exclude_sets_out_of_locale(db.products),
-            *self._exclude_series_out_of_locale(db.series),
+    @property
+    def explaining(self) -> bool:
+        """Whether steps of this search are being recorded right now."""
+        return bool(self._steps)
+
+    def explain_step(
+        self,
+        step: str,
+        within: numpy.ndarray,
+        run: typing.Callable[[], numpy.ndarray],
+        estimate: typing.Optional[int] = None,
+    ) -> numpy.ndarray:
+        """Run one step of this search, recording how it went if it's being explained.
+        Steps run within this one are recorded as its children.
+        """
+        if not self._steps:
+            return run()
+        explanation = Explanation(step, _count(within), estimate)
+        self._steps[-1].children.append(explanation)
+        self._steps.append(explanation)
+        start = time.perf_counter()
+        try:
+            result = run()
+        finally:
+            explanation.seconds = time.perf_counter() - start
+            self._steps.pop()
+        explanation.output = _count(result)
+        return result
+
+    def match(self, db: ygojson.Database) -> searchindex.Bits:
+        """Get which things match this search, without sorting them."""
+        index = searchindex.get_index(db)
+        if self.filters_locales:
+            locales = frozenset(self.locales)
+            matches = self.explain_step(
+                f"locale:{'|'.join(sorted(x.value for x in locales))}",
+                index.everything(),
+                lambda: index.match_locales(locales),
+            )
+        else:
+            matches = index.everything()
+        return match_all(db, self, self.terms, matches)
+
+    def relevance(self, db: ygojson.Database) -> typing.List[numpy.ndarray]:
+        """Get a rank array that puts closer matches to this search first,
+        or nothing if all matches are equally close.
+        Only terms that every result has to match count towards this.
+        """
+        ranks = [
+            rank
+            for rank in (term.relevance(db, self) for term in self.terms)
+            if rank is not None
         ]
-        if not self.locales:
-            self.locales = {ygojson.Locale.ENGLISH, ygojson.Locale.JAPANESE}
-        for term in self.terms:
-            results = term.execute(db, self, results)
-        return sorted(
-            results,
-            key=lambda x: tuple(sort.execute(db, self, x) for sort in self.sorts),
+        if not ranks:
+            return []
+        return [numpy.sum(ranks, axis=0, dtype=numpy.int64)]
+
+    def sort_ids(
+        self,
+        db: ygojson.Database,
+        matches: searchindex.Ids,
+        start: int = 0,
+        stop: typing.Optional[int] = None,
+    ) -> searchindex.Ids:
+        """Sort the IDs of the things matching this search, which must be sorted,
+        returning only those from `start` to `stop` in the sorted order.
+        Closer matches go first, unless the query gave sorts,
+        in which case closeness only breaks ties.
+        """
+        self.check_deadline()
+        sorts = [rank for sort in self.sorts for rank in sort.ranks(db, self)]
+        relevance = self.relevance(db)
+        self.check_deadline()
+        return searchindex.get_index(db).sort(
+            matches,
+            [*sorts, *relevance] if self.sorts_given else [*relevance, *sorts],
+            start,
+            stop,
+        )
+
+    def canonical_key(self) -> typing.Hashable:
+        """Get a value that is equal for searches with the same results,
+        even if they were written differently.
+        """
+        return (
+            canonical_terms(self.terms),
+            frozenset(self.locales),
+            self.filters_locales,
+            self.sorts_given,
+            tuple((sort.sorter.names[0], sort.dir.value) for sort in self.sorts),
         )
 
+    def execute_ids(
+        self, db: ygojson.Database, start: int = 0, stop: typing.Optional[int] = None
+    ) -> typing.Tuple[searchindex.Ids, int]:
+        """Get the IDs of the results from `start` to `stop` in sorted order,
+        and how many results there are in total.
+        The results are cached unsorted, unless there are too many of them,
+        and only as many of them as are asked for are sorted.
+        """
+        if self.explain:
+            return self._explain_ids(db, start, stop)
+        index = searchindex.get_index(db)
+        key = self.canonical_key()
+        ids = index.results.get(key)
+        if ids is None:
+            ids = numpy.flatnonzero(self.match(db))
+            if index.results.fits(len(ids)):
+                index.results.put(key, ids)
+        return self.sort_ids(db, ids, start, stop), len(ids)
+
+    def _explain_ids(
+        self, db: ygojson.Database, start: int, stop: typing.Optional[int]
+    ) -> typing.Tuple[searchindex.Ids, int]:
+        """Like `execute_ids`, but records every step in `explanation`.
+        This skips the result cache, since there would be nothing to explain.
+        """
+        index = searchindex.get_index(db)
+        self.explanation = Explanation("search", len(index.things))
+        self._steps = [self.explanation]
+        begin = time.perf_counter()
+        try:
+            matches = self.match(db)
+            ids = self.explain_step(
+                "sort",
+                matches,
+                lambda: self.sort_ids(db, numpy.flatnonzero(matches), start, stop),
+            )
+        finally:
+            self.explanation.seconds = time.perf_counter() - begin
+            self._steps = []
+        total = int(numpy.count_nonzero(matches))
+        self.explanation.output = total
+        return ids, total
+
+    def facet_counts(
+        self, db: ygojson.Database, facets: typing.List[str]
+    ) -> typing.Dict[str, typing.Dict[str, int]]:
+        """Count the results of this search by every given facet in `searchindex.FACETS`.
+        Uses the cached results, if this search has been executed already.
+        """
+        index = searchindex.get_index(db)
+        ids = index.results.get(self.canonical_key())
+        if ids is None:
+            matches = self.match(db)
+        else:
+            matches = index.nothing()
+            matches[ids] = True
+        # Years are counted from the same release dates that the date filter uses,
+        # so that refining by a year finds as many things as it says.
+        dates = FilterDateOfRelease.get_dates(db, self)
+        counts = {}
+        for facet in facets:
+            self.check_deadline()
+            counts[facet] = index.facet_counts(matches, facet, dates)
+        return counts
+
+    def execute(self, db: ygojson.Database) -> typing.List[Thing]:
+        things = searchindex.get_index(db).things
+        return [things[i] for i in self.execute_ids(db)[0].tolist()]
+
+    def execute_page(
+        self,
+        db: ygojson.Database,
+        page: int,
+        per_page: int = SEARCH_RESULTS_PER_PAGE,
+    ) -> typing.Tuple[typing.List[Thing], int]:
+        """Get one page of results, and how many results there are in total.
+        Pages start at 1.
+        """
+        things = searchindex.get_index(db).things
+        start = per_page * (page - 1)
+        ids, total = self.execute_ids(db, start, start + per_page)
+        return [things[i] for i in ids.tolist()], total
+
+
+def prefetch_batch(db: ygojson.Database, searches: typing.List[Search]) -> None:
+    """Match the predicates of many searches together, filter by filter,
+    so that each filter can share work between all of its predicates
+    (see `Filter.match_many`), and predicates that appear in several searches
+    are only matched once. Executing the searches afterwards uses the results.
+    Searches whose results are already cached are left alone.
+    """
+    index = searchindex.get_index(db)
+    # What some filters match depends on the search's locales,
+    # and on whether they were given.
+    groups: typing.Dict[
+        typing.Tuple[typing.FrozenSet[ygojson.Locale], bool], typing.List[Search]
+    ] = collections.defaultdict(list)
+    for search in searches:
+        if index.results.get(search.canonical_key()) is None:
+            groups[frozenset(search.locales), search.filters_locales].append(search)
+
+    for group in groups.values():
+        predicates: typing.Dict[
+            typing.Type[Filter], typing.Dict[typing.Hashable, TermPredicate]
+        ] = collections.defaultdict(dict)
+        for search in group:
+            for predicate in _predicates(search.terms):
+                predicates[predicate.filter].setdefault(
+                    predicate.canonical(), predicate
+                )
+
+        prefetched: typing.Dict[typing.Hashable, searchindex.Bits] = {}
+        for filter, by_key in predicates.items():
+            group[0].check_deadline()
+            matches = filter.match_many(db, group[0], [*by_key.values()])
+            prefetched.update(zip(by_key, matches))
+        for search in group:
+            search.prefetched = prefetched
+
+
+def _predicates(terms: typing.List["Term"]) -> typing.Iterator["TermPredicate"]:
+    for term in terms:
+        if isinstance(term, TermPredicate):
+            yield term
+        elif isinstance(term, (TermOr, TermNegate)):
+            yield from _predicates(term.terms)
+
 
 with open(
     os.path.join(os.path.dirname(__file__), "search.lark"), encoding="utf-8"
 ) as file:
-    LANGUAGE = lark.Lark(file)
+    # The grammar is LALR(1), so we can use the much faster LALR parser,
+    # and have Lark cache the generated parse tables between runs.
+    LANGUAGE = lark.Lark(file, parser="lalr", cache=True)
 
 ###################
 # TERMS
@@ -290,6 +760,8 @@ class TermPredicate(Term):
     filter: typing.Type[Filter]
     mode: FilterMode
     value: str
+    compiled: typing.Any
+    """The checked and parsed form of this predicate; see `Filter.compile`."""
 
     def __init__(
         self, filter: typing.Type[Filter], mode: FilterMode, value: str
@@ -298,11 +770,43 @@ class TermPredicate(Term):
         self.filter = filter
         self.mode = mode
         self.value = value
+        self.compiled = filter.compile(mode, value)
+
+    def match(
+        self, db: ygojson.Database, search: "Search", within: searchindex.Bits
+    ) -> searchindex.Bits:
+        prefetched = search.prefetched.get(self.canonical())
+        if prefetched is not None:
+            return within & prefetched
+        return self.filter.match(db, search, self, within)
+
+    def estimate(
+        self, db: ygojson.Database, search: "Search"
+    ) -> typing.Tuple[float, float]:
+        return (
+            self.filter.predicate_cost(self),
+            self.filter.estimate(db, search, self),
+        )
+
+    def relevance(
+        self, db: ygojson.Database, search: "Search"
+    ) -> typing.Optional[numpy.ndarray]:
+        return self.filter.relevance(db, search, self)
+
+    def canonical(self) -> typing.Hashable:
+        # Every filter ignores case and surrounding whitespace,
+        # but in regular expressions, those can change what escapes mean.
+        return (
+            "filter",
+            self.filter.names[0],
+            self.mode.value,
+            self.value if self.mode == FilterMode.REGEX else self.value.strip().lower(),
+        )
 
-    def execute(
-        self, db: ygojson.Database, search: "Search", results: typing.Iterable[Thing]
-    ) -> typing.Iterable[Thing]:
-        return self.filter.execute(db, search, self, results)
+    def label(self) -> str:
+        if self.mode == FilterMode.REGEX:
+            return f"{self.filter.names[0]}~/{self.value}/"
+        return f'{self.filter.names[0]}{self.mode.value}"{self.value}"'
 
     def human_readable_query(self, search: "Search") -> str:
         return self.filter.human_readable_query(search, self)
@@ -315,14 +819,30 @@ class TermOr(Term):
         super().__init__()
         self.terms = terms
 
-    def execute(
-        self, db: ygojson.Database, search: "Search", results: typing.Iterable[Thing]
-    ) -> typing.Iterable[Thing]:
-        for result in results:
-            for term in self.terms:
-                if [*term.execute(db, search, [result])]:
-                    yield result
-                    break
+    def match(
+        self, db: ygojson.Database, search: "Search", within: searchindex.Bits
+    ) -> searchindex.Bits:
+        matches = numpy.zeros_like(within)
+        for term in self.terms:
+            # Things already matched don't need to be checked again.
+            matches |= term.evaluate(db, search, within & ~matches)
+        return matches
+
+    def estimate(
+        self, db: ygojson.Database, search: "Search"
+    ) -> typing.Tuple[float, float]:
+        cost, unmatched = 0.0, 1.0
+        for term in self.terms:
+            term_cost, term_selectivity = term.estimate(db, search)
+            cost += term_cost
+            unmatched *= 1.0 - term_selectivity
+        return cost, 1.0 - unmatched
+
+    def canonical(self) -> typing.Hashable:
+        return ("or", canonical_terms(self.terms))
+
+    def label(self) -> str:
+        return "OR"
 
     def human_readable_query(self, search: "Search") -> str:
         return (
@@ -337,15 +857,22 @@ class TermNegate(Term):
         super().__init__()
         self.terms = terms
 
-    def execute(
-        self, db: ygojson.Database, search: "Search", results: typing.Iterable[Thing]
-    ) -> typing.Iterable[Thing]:
-        for result in results:
-            subresults = [result]
-            for term in self.terms:
-                subresults = [*term.execute(db, search, subresults)]
-            if not subresults:
-                yield result
+    def match(
+        self, db: ygojson.Database, search: "Search", within: searchindex.Bits
+    ) -> searchindex.Bits:
+        return within & ~match_all(db, search, self.terms, within)
+
+    def estimate(
+        self, db: ygojson.Database, search: "Search"
+    ) -> typing.Tuple[float, float]:
+        cost, selectivity = estimate_all(db, search, self.terms)
+        return cost, 1.0 - selectivity
+
+    def canonical(self) -> typing.Hashable:
+        return ("not", canonical_terms(self.terms))
+
+    def label(self) -> str:
+        return "NOT"
 
     def human_readable_query(self, search: "Search") -> str:
         return (
@@ -355,60 +882,166 @@ class TermNegate(Term):
         )
 
 
+def canonical_terms(terms: typing.List[Term]) -> typing.Hashable:
+    """Canonicalize the terms of a conjunction or alternation.
+    Order and duplicates don't change what either matches.
+    """
+    return tuple(sorted({term.canonical() for term in terms}, key=repr))
+
+
+def estimate_all(
+    db: ygojson.Database, search: "Search", terms: typing.List[Term]
+) -> typing.Tuple[float, float]:
+    """Estimate the cost and selectivity of a conjunction of terms,
+    assuming that they are independent of each other.
+    """
+    cost, selectivity = 0.0, 1.0
+    for term in terms:
+        term_cost, term_selectivity = term.estimate(db, search)
+        cost += term_cost
+        selectivity *= term_selectivity
+    return cost, selectivity
+
+
+def plan(
+    db: ygojson.Database, search: "Search", terms: typing.List[Term]
+) -> typing.List[Term]:
+    """Order a conjunction of terms so that the cheapest, most selective ones run
+    first, and so narrow down the things that the more expensive ones must check.
+    This is the order that minimizes expected cost for independent terms.
+    """
+
+    def rank(term: Term) -> typing.Tuple[float, float]:
+        cost, selectivity = term.estimate(db, search)
+        if selectivity >= 1.0:
+            return math.inf, cost
+        return cost / (1.0 - selectivity), selectivity
+
+    return sorted(terms, key=rank)
+
+
+def match_all(
+    db: ygojson.Database,
+    search: "Search",
+    terms: typing.List[Term],
+    within: searchindex.Bits,
+) -> searchindex.Bits:
+    """Get which of the things in `within` match all of the terms."""
+    matches = within
+    if len(terms) > 1:
+        terms = plan(db, search, terms)
+    for term in terms:
+        if not matches.any():
+            break
+        matches = term.evaluate(db, search, matches)
+    return matches
+
+
 ###################
 # FILTERS
 ###################
 
 
+def _compile_regex(mode: FilterMode, value: str) -> typing.Optional[str]:
+    """Check a regular expression predicate, if the predicate is one."""
+    if mode != FilterMode.REGEX:
+        return None
+    try:
+        searchindex.regex_pattern(value)
+    except ValueError as e:
+        raise SearchFailedException(f"Bad regular expression '/{value}/': {e}!")
+    return value
+
+
+def _match_regex(
+    match: typing.Callable[..., searchindex.Bits],
+    search: "Search",
+    predicate: "TermPredicate",
+    within: searchindex.Bits,
+) -> searchindex.Bits:
+    try:
+        return within & match(
+            frozenset(l.language for l in search.locales),
+            predicate.compiled,
+            within=within,
+            check_deadline=search.check_deadline,
+        )
+    except searchindex.RegexTooSlowError:
+        raise SearchFailedException(
+            f"Regular expression '/{predicate.value}/' took too long to search with! Try making it more specific."
+        )
+
+
 class FilterName(Filter):
     names = ["name", "n"]
-    desc = "Filter by card name in the selected locales."
+    desc = "Filter by card name in the selected locales. Use <tt>~</tt> to allow for typos, or <tt>~/pattern/</tt> for a regular expression."
+    modes = [FilterMode.DEFAULT, FilterMode.EQ, FilterMode.FUZZY, FilterMode.REGEX]
+    cost = VERIFY_COST
+
+    @classmethod
+    def compile(cls, mode: FilterMode, value: str) -> typing.Any:
+        return _compile_regex(mode, value) or super().compile(mode, value)
+
+    @classmethod
+    def estimate(
+        cls, db: ygojson.Database, search: "Search", predicate: "TermPredicate"
+    ) -> float:
+        index = searchindex.get_index(db)
+        languages = frozenset(l.language for l in search.locales)
+        if predicate.mode == FilterMode.FUZZY:
+            return index.estimate_fuzzy_names(languages, predicate.compiled)
+        if predicate.mode == FilterMode.REGEX:
+            return index.estimate_regex_names(languages, predicate.compiled)
+        return index.estimate_names(
+            languages, predicate.compiled, predicate.mode == FilterMode.EQ
+        )
 
     @classmethod
-    def execute(
+    def predicate_cost(cls, predicate: "TermPredicate") -> float:
+        if predicate.mode == FilterMode.EQ:
+            return INDEX_COST
+        if predicate.mode == FilterMode.FUZZY:
+            return FUZZY_COST
+        if predicate.mode == FilterMode.REGEX:
+            return REGEX_COST
+        return cls.cost
+
+    @classmethod
+    def match(
         cls,
         db: ygojson.Database,
         search: "Search",
         predicate: "TermPredicate",
-        results: typing.Iterable[Thing],
-    ) -> typing.Iterable[Thing]:
-        query_normalized = predicate.value.strip().lower()
-
-        def cmp(s: str) -> bool:
-            if predicate.mode == FilterMode.DEFAULT:
-                return query_normalized in s
-            elif predicate.mode == FilterMode.EQ:
-                return query_normalized == s
-            raise SearchFailedException(
-                f"Search filter 'name' does not accept filter mode '{predicate.mode.value}'!"
+        within: searchindex.Bits,
+    ) -> searchindex.Bits:
+        index = searchindex.get_index(db)
+        languages = frozenset(l.language for l in search.locales)
+        if predicate.mode == FilterMode.FUZZY:
+            distances = index.fuzzy_names(
+                languages, predicate.compiled, check_deadline=search.check_deadline
             )
+            return within & (distances != searchindex.FUZZY_NO_MATCH)
+        if predicate.mode == FilterMode.REGEX:
+            return _match_regex(index.match_regex_names, search, predicate, within)
+        return within & index.match_names(
+            languages,
+            predicate.compiled,
+            predicate.mode == FilterMode.EQ,
+            within=within,
+            check_deadline=search.check_deadline,
+        )
 
-        for result in results:
-            if type(result) is ygojson.Card:
-                if any(
-                    l.language in result.text
-                    and cmp(result.text[l.language].name.lower())
-                    for l in search.locales
-                ):
-                    yield result
-            elif type(result) is ygojson.Set:
-                if any(
-                    l.language in result.name and cmp(result.name[l.language].lower())
-                    for l in search.locales
-                ):
-                    yield result
-            elif type(result) is ygojson.Series:
-                if any(
-                    l.language in result.name and cmp(result.name[l.language].lower())
-                    for l in search.locales
-                ):
-                    yield result
-            elif type(result) is ygojson.SealedProduct:
-                if any(
-                    l.language in result.name and cmp(result.name[l.language].lower())
-                    for l in search.locales
-                ):
-                    yield result
+    @classmethod
+    def relevance(
+        cls, db: ygojson.Database, search: "Search", predicate: "TermPredicate"
+    ) -> typing.Optional[numpy.ndarray]:
+        if predicate.mode != FilterMode.FUZZY:
+            return None
+        return searchindex.get_index(db).fuzzy_names(
+            frozenset(l.language for l in search.locales),
+            predicate.compiled,
+            check_deadline=search.check_deadline,
+        )
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
@@ -416,49 +1049,58 @@ class FilterName(Filter):
             return f"whose name contains '{predicate.value}'"
         elif predicate.mode == FilterMode.EQ:
             return f"named '{predicate.value}'"
+        elif predicate.mode == FilterMode.FUZZY:
+            return f"whose name contains something like '{predicate.value}'"
+        elif predicate.mode == FilterMode.REGEX:
+            return f"whose name matches /{predicate.value}/"
         else:
             return f"<ERROR: bad mode '{predicate.mode.value}'>"
 
 
 class FilterEffect(Filter):
     names = ["effect", "e"]
-    desc = "Filter by effect text or card lore in the selected locales."
+    desc = "Filter by effect text or card lore in the selected locales. Use <tt>~/pattern/</tt> for a regular expression."
+    modes = [FilterMode.DEFAULT, FilterMode.EQ, FilterMode.REGEX]
+    cost = VERIFY_COST
 
     @classmethod
-    def execute(
+    def compile(cls, mode: FilterMode, value: str) -> typing.Any:
+        return _compile_regex(mode, value) or super().compile(mode, value)
+
+    @classmethod
+    def estimate(
+        cls, db: ygojson.Database, search: "Search", predicate: "TermPredicate"
+    ) -> float:
+        index = searchindex.get_index(db)
+        languages = frozenset(l.language for l in search.locales)
+        if predicate.mode == FilterMode.REGEX:
+            return index.estimate_regex_effects(languages, predicate.compiled)
+        return index.estimate_effects(languages, predicate.compiled)
+
+    @classmethod
+    def predicate_cost(cls, predicate: "TermPredicate") -> float:
+        if predicate.mode == FilterMode.REGEX:
+            return REGEX_COST
+        return cls.cost
+
+    @classmethod
+    def match(
         cls,
         db: ygojson.Database,
         search: "Search",
         predicate: "TermPredicate",
-        results: typing.Iterable[Thing],
-    ) -> typing.Iterable[Thing]:
-        query_normalized = predicate.value.strip().lower()
-
-        def cmp(s: str) -> bool:
-            if predicate.mode == FilterMode.DEFAULT:
-                return query_normalized in s
-            elif predicate.mode == FilterMode.EQ:
-                return query_normalized == s
-            raise SearchFailedException(
-                f"Search filter 'effect' does not accept filter mode '{predicate.mode.value}'!"
-            )
-
-        for result in results:
-            if type(result) is ygojson.Card:
-                if any(
-                    l in result.text
-                    and cmp(
-                        (
-                            (result.text[l].pendulum_effect or "")
-                            + "\n"
-                            + (result.text[l].effect or "")
-                        )
-                        .strip()
-                        .lower()
-                    )
-                    for l in search.locales
-                ):
-                    yield result
+        within: searchindex.Bits,
+    ) -> searchindex.Bits:
+        index = searchindex.get_index(db)
+        if predicate.mode == FilterMode.REGEX:
+            return _match_regex(index.match_regex_effects, search, predicate, within)
+        return within & index.match_effects(
+            frozenset(l.language for l in search.locales),
+            predicate.compiled,
+            predicate.mode == FilterMode.EQ,
+            within=within,
+            check_deadline=search.check_deadline,
+        )
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
@@ -466,6 +1108,8 @@ class FilterEffect(Filter):
             return f"whose effect contains '{predicate.value}'"
         elif predicate.mode == FilterMode.EQ:
             return f"whose effect is '{predicate.value}'"
+        elif predicate.mode == FilterMode.REGEX:
+            return f"whose effect matches /{predicate.value}/"
         else:
             return f"<ERROR: bad mode '{predicate.mode.value}'>"
 
@@ -499,29 +1143,34 @@ THING_NAMES = {
 class FilterClass(Filter):
     names = ["class", "cl", ""]
     desc = "Filter by what type of thing you want to see: <tt>card</tt>, <tt>set<tt>, <tt>product</tt>, or <tt>series</tt>."
+    modes = [FilterMode.DEFAULT, FilterMode.EQ]
+    cost = INDEX_COST
 
     @classmethod
-    def execute(
-        cls,
-        db: ygojson.Database,
-        search: "Search",
-        predicate: "TermPredicate",
-        results: typing.Iterable[Thing],
-    ) -> typing.Iterable[Thing]:
-        query_normalized = predicate.value.strip().lower()
-        if predicate.mode not in {FilterMode.DEFAULT, FilterMode.EQ}:
-            raise SearchFailedException(
-                f"Search filter 'class' does not accept filter mode '{predicate.mode.value}'!"
-            )
+    def compile(cls, mode: FilterMode, value: str) -> typing.Any:
+        query_normalized = super().compile(mode, value)
         if query_normalized not in FILTER_CLASS_OPTIONS:
             raise SearchFailedException(
                 f"""Search filter 'class' does not accept value '{query_normalized}'!
 Accaptable values include 'card' (or 'c'), 'pack'/'set' or ('s'), 'sealed'/'product' (or 'p'), or 'series'/'archetype' (or 'a')."""
             )
-        clazz = FILTER_CLASS_OPTIONS[query_normalized]
-        for result in results:
-            if type(result) is clazz:
-                yield result
+        return FILTER_CLASS_OPTIONS[query_normalized]
+
+    @classmethod
+    def estimate(
+        cls, db: ygojson.Database, search: "Search", predicate: "TermPredicate"
+    ) -> float:
+        return searchindex.get_index(db).estimate_class(predicate.compiled)
+
+    @classmethod
+    def match(
+        cls,
+        db: ygojson.Database,
+        search: "Search",
+        predicate: "TermPredicate",
+        within: searchindex.Bits,
+    ) -> searchindex.Bits:
+        return within & searchindex.get_index(db).match_class(predicate.compiled)
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
@@ -531,46 +1180,37 @@ Accaptable values include 'card' (or 'c'), 'pack'/'set' or ('s'), 'sealed'/'prod
         return f"that are {THING_NAMES[thingtype]}"
 
 
-class FilterType(Filter):
-    names = ["type", "t"]
-    desc = "Filter by the contents of a card's typeline."
+class FilterEnum(Filter):
+    enum: typing.ClassVar[str]
+    """The key of this filter's index in `searchindex.ENUMS`."""
+    modes = [FilterMode.DEFAULT, FilterMode.EQ]
+    cost = INDEX_COST
 
     @classmethod
-    def execute(
+    def estimate(
+        cls, db: ygojson.Database, search: "Search", predicate: "TermPredicate"
+    ) -> float:
+        return searchindex.get_index(db).estimate_enum(
+            cls.enum, predicate.compiled, predicate.mode == FilterMode.EQ
+        )
+
+    @classmethod
+    def match(
         cls,
         db: ygojson.Database,
         search: "Search",
         predicate: "TermPredicate",
-        results: typing.Iterable[Thing],
-    ) -> typing.Iterable[Thing]:
-        query_normalized = predicate.value.strip().lower()
-
-        def cmp(s: str) -> bool:
-            if predicate.mode == FilterMode.DEFAULT:
-                return query_normalized in s
-            elif predicate.mode == FilterMode.EQ:
-                return query_normalized in s.split("\n")
-            raise SearchFailedException(
-                f"Search filter 'type' does not accept filter mode '{predicate.mode.value}'!"
-            )
+        within: searchindex.Bits,
+    ) -> searchindex.Bits:
+        return within & searchindex.get_index(db).match_enum(
+            cls.enum, predicate.compiled, predicate.mode == FilterMode.EQ
+        )
 
-        for result in results:
-            if type(result) is ygojson.Card:
-                if cmp(
-                    "\n".join(
-                        [
-                            result.card_type.value,
-                            result.type.value if result.type else "",
-                            result.subcategory.value if result.subcategory else "",
-                            result.character if result.character else "",
-                            result.skill_type if result.skill_type else "",
-                            *[t.value for t in result.monster_card_types or []],
-                            *[t.value for t in result.classifications or []],
-                            *[t.value for t in result.abilities or []],
-                        ]
-                    )
-                ):
-                    yield result
+
+class FilterType(FilterEnum):
+    names = ["type", "t"]
+    desc = "Filter by the contents of a card's typeline."
+    enum = "type"
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
@@ -582,87 +1222,84 @@ class FilterType(Filter):
             return f"<ERROR: bad mode '{predicate.mode.value}'>"
 
 
-class FilterAttribute(Filter):
+class FilterAttribute(FilterEnum):
     names = ["attribute", "attr", "a"]
     desc = "Filter by a card's attribute."
-
-    @classmethod
-    def execute(
-        cls,
-        db: ygojson.Database,
-        search: "Search",
-        predicate: "TermPredicate",
-        results: typing.Iterable[Thing],
-    ) -> typing.Iterable[Thing]:
-        query_normalized = predicate.value.strip().lower()
-
-        def cmp(s: str) -> bool:
-            if predicate.mode == FilterMode.DEFAULT:
-                return query_normalized in s
-            elif predicate.mode == FilterMode.EQ:
-                return query_normalized == s
-            raise SearchFailedException(
-                f"Search filter 'attribute' does not accept filter mode '{predicate.mode.value}'!"
-            )
-
-        for result in results:
-            if type(result) is ygojson.Card:
-                if result.attribute and cmp(result.attribute.value):
-                    yield result
+    enum = "attribute"
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
         return f"whose attribute is '{predicate.value}'"
 
 
+FILTER_MODE_TO_OPERATOR = {
+    FilterMode.DEFAULT: operator.eq,
+    FilterMode.EQ: operator.eq,
+    FilterMode.GT: operator.gt,
+    FilterMode.LT: operator.lt,
+    FilterMode.GE: operator.ge,
+    FilterMode.LE: operator.le,
+}
+
+
 class FilterInt(Filter):
+    stat: typing.ClassVar[str]
+    """The key of this filter's column in `searchindex.STATS`."""
+    cost = INDEX_COST
+
     @classmethod
-    def get_int_prop(
-        cls, db: ygojson.Database, predicate: "TermPredicate", result: Thing
-    ) -> typing.Union[None, int, str]:
-        raise NotImplementedError
+    def compile(cls, mode: FilterMode, value: str) -> typing.Any:
+        """Returns an operator and a value to compare with (None for "?"),
+        or None if nothing can match.
+        """
+        query_normalized = super().compile(mode, value)
+        try:
+            return FILTER_MODE_TO_OPERATOR[mode], int(query_normalized)
+        except ValueError:
+            pass
+        if mode != FilterMode.DEFAULT and mode != FilterMode.EQ:
+            raise SearchFailedException(
+                f"Search filter '{cls.names[0]}' does not accept filter mode '{mode.value}' for non-number values!"
+            )
+        if query_normalized != "?":
+            return None
+        return operator.eq, None
+
+    @classmethod
+    def estimate(
+        cls, db: ygojson.Database, search: "Search", predicate: "TermPredicate"
+    ) -> float:
+        if predicate.compiled is None:
+            return 0.0
+        op, query_int = predicate.compiled
+        return searchindex.get_index(db).estimate_stat(cls.stat, op, query_int)
 
     @classmethod
-    def execute(
+    def match(
         cls,
         db: ygojson.Database,
         search: "Search",
         predicate: "TermPredicate",
-        results: typing.Iterable[Thing],
-    ) -> typing.Iterable[Thing]:
-        query_normalized = predicate.value.strip().lower()
+        within: searchindex.Bits,
+    ) -> searchindex.Bits:
+        if predicate.compiled is None:
+            return numpy.zeros_like(within)
+        op, query_int = predicate.compiled
+        return within & searchindex.get_index(db).match_stat(cls.stat, op, query_int)
 
-        def cmp(s: typing.Union[str, int]) -> bool:
-            try:
-                query_int = int(query_normalized)
-                if (
-                    predicate.mode == FilterMode.DEFAULT
-                    or predicate.mode == FilterMode.EQ
-                ):
-                    return query_int == s
-                elif predicate.mode == FilterMode.GT and type(s) is int:
-                    return s > query_int
-                elif predicate.mode == FilterMode.GE and type(s) is int:
-                    return s >= query_int
-                elif predicate.mode == FilterMode.LT and type(s) is int:
-                    return s < query_int
-                elif predicate.mode == FilterMode.LE and type(s) is int:
-                    return s <= query_int
-                return False
-            except ValueError:
-                if (
-                    predicate.mode == FilterMode.DEFAULT
-                    or predicate.mode == FilterMode.EQ
-                ):
-                    return query_normalized == s
-                raise SearchFailedException(
-                    f"Search filter '{cls.names[0]}' does not accept filter mode '{predicate.mode.value}' for non-number values!"
-                )
-
-        for result in results:
-            value = cls.get_int_prop(db, predicate, result)
-            if value is not None and cmp(value):
-                yield result
+    @classmethod
+    def match_many(
+        cls,
+        db: ygojson.Database,
+        search: "Search",
+        predicates: typing.List["TermPredicate"],
+    ) -> typing.List[searchindex.Bits]:
+        index = searchindex.get_index(db)
+        comparisons = [x.compiled for x in predicates if x.compiled is not None]
+        matches = iter(index.match_stats(cls.stat, comparisons))
+        return [
+            index.nothing() if x.compiled is None else next(matches) for x in predicates
+        ]
 
 
 FILTER_MODE_TO_NAME = {
@@ -678,14 +1315,7 @@ FILTER_MODE_TO_NAME = {
 class FilterATK(FilterInt):
     names = ["attack", "atk", "at"]
     desc = "Filter by cards with, greater than, or less than a certain ATK."
-
-    @classmethod
-    def get_int_prop(
-        cls, db: ygojson.Database, predicate: "TermPredicate", result: Thing
-    ) -> typing.Union[None, int, str]:
-        if type(result) is ygojson.Card:
-            return result.atk
-        return None
+    stat = "atk"
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
@@ -695,14 +1325,7 @@ class FilterATK(FilterInt):
 class FilterDEF(FilterInt):
     names = ["defence", "defense", "def", "de"]
     desc = "Filter by cards with, greater than, or less than a certain DEF."
-
-    @classmethod
-    def get_int_prop(
-        cls, db: ygojson.Database, predicate: "TermPredicate", result: Thing
-    ) -> typing.Union[None, int, str]:
-        if type(result) is ygojson.Card:
-            return result.def_
-        return None
+    stat = "def"
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
@@ -712,14 +1335,7 @@ class FilterDEF(FilterInt):
 class FilterLevel(FilterInt):
     names = ["level", "lvl", "lv", "l"]
     desc = "Filter by cards with, greater than, or less than a certain level. This does NOT match to Xyz monsters."
-
-    @classmethod
-    def get_int_prop(
-        cls, db: ygojson.Database, predicate: "TermPredicate", result: Thing
-    ) -> typing.Union[None, int, str]:
-        if type(result) is ygojson.Card:
-            return result.level
-        return None
+    stat = "level"
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
@@ -729,14 +1345,7 @@ class FilterLevel(FilterInt):
 class FilterRank(FilterInt):
     names = ["rank", "r"]
     desc = "Filter by cards with, greater than, or less than a certain rank. This does NOT match to non-Xyz monsters."
-
-    @classmethod
-    def get_int_prop(
-        cls, db: ygojson.Database, predicate: "TermPredicate", result: Thing
-    ) -> typing.Union[None, int, str]:
-        if type(result) is ygojson.Card:
-            return result.rank
-        return None
+    stat = "rank"
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
@@ -746,14 +1355,7 @@ class FilterRank(FilterInt):
 class FilterScale(FilterInt):
     names = ["scale", "sc"]
     desc = "Filter by cards with, greater than, or less than a certain pendulum scale."
-
-    @classmethod
-    def get_int_prop(
-        cls, db: ygojson.Database, predicate: "TermPredicate", result: Thing
-    ) -> typing.Union[None, int, str]:
-        if type(result) is ygojson.Card:
-            return result.scale
-        return None
+    stat = "scale"
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
@@ -763,14 +1365,7 @@ class FilterScale(FilterInt):
 class FilterLinkRating(FilterInt):
     names = ["linkrating", "link", "lr"]
     desc = "Filter by cards with, greater than, or less than a certain link rating."
-
-    @classmethod
-    def get_int_prop(
-        cls, db: ygojson.Database, predicate: "TermPredicate", result: Thing
-    ) -> typing.Union[None, int, str]:
-        if type(result) is ygojson.Card:
-            return len(result.link_arrows or [])
-        return None
+    stat = "linkrating"
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
@@ -779,10 +1374,6 @@ class FilterLinkRating(FilterInt):
         )
 
 
-def _date_to_timestamp(date: datetime.date) -> float:
-    return datetime.datetime(date.year, date.month, date.day).timestamp()
-
-
 FILTER_MODE_TO_DATE_NAME = {
     FilterMode.DEFAULT: "on",
     FilterMode.EQ: "on exactly",
@@ -794,87 +1385,54 @@ FILTER_MODE_TO_DATE_NAME = {
 
 
 class FilterDate(Filter):
+    cost = INDEX_COST
+
     @classmethod
-    def get_date_prop(
-        cls, db: ygojson.Database, predicate: "TermPredicate", result: Thing
-    ) -> typing.Optional[datetime.date]:
+    def get_dates(
+        cls, db: ygojson.Database, search: "Search"
+    ) -> searchindex.DateColumn:
         raise NotImplementedError
 
     @classmethod
-    def execute(
+    def compile(cls, mode: FilterMode, value: str) -> typing.Any:
+        """Returns an operator and the ordinal of the date to compare with."""
+        try:
+            date = datetime.date.fromisoformat(super().compile(mode, value))
+        except ValueError:
+            raise SearchFailedException(
+                f"Search filter '{cls.names[0]}' does not accept non-date values!\nDates are expected in ISO format (YYYY-MM-DD)."
+            )
+        return FILTER_MODE_TO_OPERATOR[mode], date.toordinal()
+
+    @classmethod
+    def estimate(
+        cls, db: ygojson.Database, search: "Search", predicate: "TermPredicate"
+    ) -> float:
+        return cls.get_dates(db, search).estimate(*predicate.compiled)
+
+    @classmethod
+    def match(
         cls,
         db: ygojson.Database,
         search: "Search",
         predicate: "TermPredicate",
-        results: typing.Iterable[Thing],
-    ) -> typing.Iterable[Thing]:
-        query_normalized = predicate.value.strip().lower()
-
-        def cmp(s: float) -> bool:
-            try:
-                query_timestamp = _date_to_timestamp(
-                    datetime.date.fromisoformat(query_normalized)
-                )
-                if (
-                    predicate.mode == FilterMode.DEFAULT
-                    or predicate.mode == FilterMode.EQ
-                ):
-                    return s == query_timestamp
-                elif predicate.mode == FilterMode.GT:
-                    return s > query_timestamp
-                elif predicate.mode == FilterMode.GE:
-                    return s >= query_timestamp
-                elif predicate.mode == FilterMode.LT:
-                    return s < query_timestamp
-                elif predicate.mode == FilterMode.LE:
-                    return s <= query_timestamp
-                return False
-            except ValueError:
-                raise SearchFailedException(
-                    f"Search filter '{cls.names[0]}' does not accept non-date values!\nDates are expected in ISO format (YYYY-MM-DD)."
-                )
-
-        for result in results:
-            value = cls.get_date_prop(db, predicate, result)
-            if value is not None and cmp(_date_to_timestamp(value)):
-                yield result
-
-
-def _get_release_date(result: Thing) -> typing.Optional[datetime.date]:
-    if type(result) is ygojson.Card:
-        dates = []
-        for set_ in result.sets:
-            locales: typing.Set[ygojson.SetLocale] = set()
-            for content in set_.contents:
-                for printing in content.cards:
-                    if printing.card == result:
-                        locales.update(content.locales)
-            if not locales and set_.date:
-                dates.append(set_.date)
-            for locale in locales:
-                if locale.date:
-                    dates.append(locale.date)
-        if dates:
-            return min(dates)
-    elif type(result) is ygojson.Set or type(result) is ygojson.SealedProduct:
-        if result.date:
-            return result.date
-        dates = [x.date for x in result.locales.values() if x.date]
-        if dates:
-            return min(dates)
-    else:
-        return None
+        within: searchindex.Bits,
+    ) -> searchindex.Bits:
+        return within & cls.get_dates(db, search).match(*predicate.compiled)
 
 
 class FilterDateOfRelease(FilterDate):
     names = ["date", "d"]
-    desc = "Filter by cards and/or sets that came out for the first time at, before, or after the given date."
+    desc = "Filter by cards and/or sets that came out for the first time at, before, or after the given date. If you give locales, only releases in them count."
 
     @classmethod
-    def get_date_prop(
-        cls, db: ygojson.Database, predicate: "TermPredicate", result: Thing
-    ) -> typing.Optional[datetime.date]:
-        return _get_release_date(result)
+    def get_dates(
+        cls, db: ygojson.Database, search: "Search"
+    ) -> searchindex.DateColumn:
+        index = searchindex.get_index(db)
+        if search.filters_locales:
+            return index.release_dates_in(frozenset(search.locales))
+        return index.release_dates
 
     @classmethod
     def human_readable_query(cls, search: "Search", predicate: "TermPredicate") -> str:
@@ -901,6 +1459,46 @@ FILTERS = [
 
 FILTER_NAME_MAP = {name: filter for filter in FILTERS for name in filter.names}
 
+###################
+# FACETS
+###################
+
+FACET_FILTERS: typing.Dict[str, typing.Type[Filter]] = {
+    "class": FilterClass,
+    "year": FilterDateOfRelease,
+    **{f.enum: f for f in FILTERS if issubclass(f, FilterEnum)},
+    **{f.stat: f for f in FILTERS if issubclass(f, FilterInt)},
+}
+"""The filter that narrows a search down to one value of every facet."""
+
+FACET_TITLES = {
+    "class": "Class",
+    "year": "Release year",
+    "type": "Type",
+    "attribute": "Attribute",
+    "atk": "ATK",
+    "def": "DEF",
+    "level": "Level",
+    "rank": "Rank",
+    "scale": "Pendulum scale",
+    "linkrating": "Link rating",
+}
+
+DEFAULT_FACETS = ["class", "type", "attribute", "level", "year"]
+
+
+def facet_term(facet: str, value: str) -> typing.Optional[str]:
+    """Get search terms for things with the given value of a facet,
+    or None if the value can't be written in a search.
+    """
+    filtername = FACET_FILTERS[facet].names[0]
+    if facet == "year":
+        return f"{filtername}>={value}-01-01 {filtername}<={value}-12-31"
+    if '"' in value:
+        return None
+    return f'{filtername}="{value}"'
+
+
 ###################
 # SORTERS
 ###################
@@ -911,20 +1509,10 @@ class SorterClass(Sorter):
     desc = "Sort by what type of thing it is, in card -> set -> sealed product -> series/archetype order."
 
     @classmethod
-    def execute(
-        cls, search: "Search", db: ygojson.Database, result: Thing, dir: SortDir
-    ) -> typing.Any:
-        dir_factor = 1 if dir == SortDir.ASC else -1
-        if type(result) is ygojson.Card:
-            return 1 * dir_factor
-        elif type(result) is ygojson.Set:
-            return 2 * dir_factor
-        elif type(result) is ygojson.Series:
-            return 4 * dir_factor
-        elif type(result) is ygojson.SealedProduct:
-            return 3 * dir_factor
-        else:
-            return 5 * dir_factor
+    def keys(
+        cls, search: "Search", db: ygojson.Database
+    ) -> typing.List[searchindex.SortKey]:
+        return [searchindex.get_index(db).sort_keys["class"]]
 
     @classmethod
     def human_readable_query(cls, search: "Search") -> str:
@@ -936,186 +1524,85 @@ class SorterName(Sorter):
     desc = "Sort by names in the selected locale."
 
     @classmethod
-    def execute(
-        cls, search: "Search", db: ygojson.Database, result: Thing, dir: SortDir
-    ) -> typing.Any:
-        if type(result) is ygojson.Card:
-            s = "\n".join(
-                (
-                    result.text[l.language].name.lower()
-                    if l.language in result.text
-                    else "�"
-                )
-                for l in sorted(search.locales, key=lambda x: x.value)
-            )
-        elif type(result) is ygojson.Set:
-            s = "\n".join(
-                (result.name[l.language].lower() if l.language in result.name else "�")
-                for l in sorted(search.locales, key=lambda x: x.value)
-            )
-        elif type(result) is ygojson.Series:
-            s = "\n".join(
-                (result.name[l.language].lower() if l.language in result.name else "�")
-                for l in sorted(search.locales, key=lambda x: x.value)
-            )
-        elif type(result) is ygojson.SealedProduct:
-            s = "\n".join(
-                (result.name[l.language].lower() if l.language in result.name else "�")
-                for l in sorted(search.locales, key=lambda x: x.value)
-            )
-        else:
-            return None
-
-        if dir == SortDir.ASC:
-            return s
-        else:
-            return tuple(-ord(c) for c in s)
+    def keys(
+        cls, search: "Search", db: ygojson.Database
+    ) -> typing.List[searchindex.SortKey]:
+        index = searchindex.get_index(db)
+        return [
+            index.name_sort_key(l.language)
+            for l in sorted(search.locales, key=lambda x: x.value)
+        ]
 
     @classmethod
     def human_readable_query(cls, search: "Search") -> str:
         return "name"
 
 
-class SorterATK(Sorter):
-    names = ["attack", "atk", "at"]
-    desc = "Sort by ATK."
+class SorterStat(Sorter):
+    stat: typing.ClassVar[str]
+    """The key of this sorter's column in `searchindex.STATS`."""
 
     @classmethod
-    def execute(
-        cls, search: "Search", db: ygojson.Database, result: Thing, dir: SortDir
-    ) -> typing.Any:
-        if type(result) is ygojson.Card:
-            v = result.atk
-            if v is None:
-                return sys.maxsize
-            elif type(v) is str:
-                return sys.maxsize - 1
-            elif dir == SortDir.ASC:
-                return v
-            else:
-                return -int(v)
-        else:
-            return sys.maxsize
+    def keys(
+        cls, search: "Search", db: ygojson.Database
+    ) -> typing.List[searchindex.SortKey]:
+        return [searchindex.get_index(db).sort_keys[cls.stat]]
+
+
+class SorterATK(SorterStat):
+    names = ["attack", "atk", "at"]
+    desc = "Sort by ATK."
+    stat = "atk"
 
     @classmethod
     def human_readable_query(cls, search: "Search") -> str:
         return "ATK"
 
 
-class SorterDEF(Sorter):
+class SorterDEF(SorterStat):
     names = ["defence", "defense", "def", "de"]
     desc = "Sort by DEF."
-
-    @classmethod
-    def execute(
-        cls, search: "Search", db: ygojson.Database, result: Thing, dir: SortDir
-    ) -> typing.Any:
-        if type(result) is ygojson.Card:
-            v = result.def_
-            if v is None:
-                return sys.maxsize
-            elif type(v) is str:
-                return sys.maxsize - 1
-            elif dir == SortDir.ASC:
-                return v
-            else:
-                return -int(v)
-        else:
-            return sys.maxsize
+    stat = "def"
 
     @classmethod
     def human_readable_query(cls, search: "Search") -> str:
         return "DEF"
 
 
-class SorterLevel(Sorter):
+class SorterLevel(SorterStat):
     names = ["level", "lvl", "lv", "l"]
     desc = "Sort by level. Does NOT sort ranks in with levels."
-
-    @classmethod
-    def execute(
-        cls, search: "Search", db: ygojson.Database, result: Thing, dir: SortDir
-    ) -> typing.Any:
-        if type(result) is ygojson.Card:
-            v = result.level
-            if v is None:
-                return sys.maxsize
-            elif dir == SortDir.ASC:
-                return v
-            else:
-                return -int(v)
-        else:
-            return sys.maxsize
+    stat = "level"
 
     @classmethod
     def human_readable_query(cls, search: "Search") -> str:
         return "level"
 
 
-class SorterRank(Sorter):
+class SorterRank(SorterStat):
     names = ["rank", "r"]
     desc = "Sort by rank. Does NOT sort levels in with ranks."
-
-    @classmethod
-    def execute(
-        cls, search: "Search", db: ygojson.Database, result: Thing, dir: SortDir
-    ) -> typing.Any:
-        if type(result) is ygojson.Card:
-            v = result.rank
-            if v is None:
-                return sys.maxsize
-            elif dir == SortDir.ASC:
-                return v
-            else:
-                return -int(v)
-        else:
-            return sys.maxsize
+    stat = "rank"
 
     @classmethod
     def human_readable_query(cls, search: "Search") -> str:
         return "rank"
 
 
-class SorterScale(Sorter):
+class SorterScale(SorterStat):
     names = ["scale", "sc"]
     desc = "Sort by pendulum scale."
-
-    @classmethod
-    def execute(
-        cls, search: "Search", db: ygojson.Database, result: Thing, dir: SortDir
-    ) -> typing.Any:
-        if type(result) is ygojson.Card:
-            v = result.scale
-            if v is None:
-                return sys.maxsize
-            elif dir == SortDir.ASC:
-                return v
-            else:
-                return -int(v)
-        else:
-            return sys.maxsize
+    stat = "scale"
 
     @classmethod
     def human_readable_query(cls, search: "Search") -> str:
         return "pendulum scale"
 
 
-class SorterLink(Sorter):
+class SorterLink(SorterStat):
     names = ["linkranking", "link", "lr"]
     desc = "Sort by link rating."
-
-    @classmethod
-    def execute(
-        cls, search: "Search", db: ygojson.Database, result: Thing, dir: SortDir
-    ) -> typing.Any:
-        if type(result) is ygojson.Card:
-            v = len(result.link_arrows or [])
-            if dir == SortDir.ASC:
-                return v
-            else:
-                return -int(v)
-        else:
-            return sys.maxsize
+    stat = "linkrating"
 
     @classmethod
     def human_readable_query(cls, search: "Search") -> str:
@@ -1127,16 +1614,10 @@ class SorterDate(Sorter):
     desc = "Sort by first release date."
 
     @classmethod
-    def execute(
-        cls, search: "Search", db: ygojson.Database, result: Thing, dir: SortDir
-    ) -> typing.Any:
-        date = _get_release_date(result)
-        if date is None:
-            return math.inf
-        elif dir == SortDir.ASC:
-            return _date_to_timestamp(date)
-        elif dir == SortDir.DESC:
-            return -_date_to_timestamp(date)
+    def keys(
+        cls, search: "Search", db: ygojson.Database
+    ) -> typing.List[searchindex.SortKey]:
+        return [searchindex.get_index(db).sort_keys["date"]]
 
     @classmethod
     def human_readable_query(cls, search: "Search") -> str:
@@ -0,0 +1,1667 @@
+import bisect
+import codecs
+import collections
+import datetime
+import functools
+import math
+import operator
+import re
+import threading
+import time
+import typing
+import weakref
+
+import numpy
+import ygojson
+
+Thing = typing.Union[ygojson.Card, ygojson.Set, ygojson.Series, ygojson.SealedProduct]
+
+Ids = numpy.ndarray
+"""A sorted array of dense thing IDs, as indices into `SearchIndex.things`."""
+Bits = numpy.ndarray
+"""A set of things, as a boolean array indexed by dense thing ID."""
+
+NGRAM_LENGTH = 3
+POSITION_BITS = 20
+LOOKUP_CACHE_SIZE = 256
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+SUGGESTIONS = 10
+FUZZY_MAX_ERRORS = 3
+SUGGEST_PRECOMPUTED_LENGTH = 2
+DEADLINE_CHECK_INTERVAL = 32
+"""How many candidates loops over candidates check between checks of the deadline."""
+REGEX_CACHE_SIZE = 256
+REGEX_TIME_BUDGET = 1.0
+"""How many seconds a regular expression search may take before giving up."""
+REGEX_MAX_REPETITIONS = 2
+"""How many long repetitions, like ``.*`` or ``\\w+``, a regular expression may have.
+Each one can multiply how long matching a text takes by the length of the text.
+"""
+REGEX_LONG_REPETITION = 10
+"""How much longer than its minimum a bounded repetition may be before it's long."""
+
+MISSING = numpy.iinfo(numpy.int64).min
+"""The value of a stat column for things without that stat."""
+UNKNOWN = MISSING + 1
+"""The value of a stat column for cards where that stat is "?"."""
+_INT_MAX = numpy.iinfo(numpy.int64).max
+FUZZY_NO_MATCH = numpy.iinfo(numpy.int32).max
+"""The distance from a fuzzy query to things that don't match it."""
+
+DeadlineCheck = typing.Callable[[], None]
+"""Called regularly by slow lookups, so that whoever asked for them can stop them
+by raising an exception.
+"""
+
+StatGetter = typing.Callable[[ygojson.Card], typing.Union[None, int, str]]
+
+STATS: typing.Dict[str, StatGetter] = {
+    "atk": lambda card: card.atk,
+    "def": lambda card: card.def_,
+    "level": lambda card: card.level,
+    "rank": lambda card: card.rank,
+    "scale": lambda card: card.scale,
+    "linkrating": lambda card: len(card.link_arrows or []),
+}
+"""The numeric card stats that get a column in `SearchIndex.stats`."""
+
+EnumGetter = typing.Callable[[ygojson.Card], typing.List[str]]
+
+
+def typeline(card: ygojson.Card) -> typing.List[str]:
+    """Everything that type searches look at, one entry per line of the typeline."""
+    return [
+        card.card_type.value,
+        card.type.value if card.type else "",
+        card.subcategory.value if card.subcategory else "",
+        card.character if card.character else "",
+        card.skill_type if card.skill_type else "",
+        *[t.value for t in card.monster_card_types or []],
+        *[t.value for t in card.classifications or []],
+        *[t.value for t in card.abilities or []],
+    ]
+
+
+ENUMS: typing.Dict[str, EnumGetter] = {
+    "type": typeline,
+    "attribute": lambda card: [card.attribute.value] if card.attribute else [],
+}
+"""The enumerated card properties that get an `EnumIndex` in `SearchIndex.enums`."""
+
+CLASS_NAMES: typing.Dict[typing.Type, str] = {
+    ygojson.Card: "card",
+    ygojson.Set: "set",
+    ygojson.SealedProduct: "product",
+    ygojson.Series: "series",
+}
+
+FACETS = ["class", "year", *ENUMS, *STATS]
+"""What `SearchIndex.facet_counts` can count search results by."""
+
+# Once this few candidates remain, it's cheaper to check them directly
+# than to keep intersecting posting lists.
+VERIFY_THRESHOLD = 64
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff66-\uff9f"
+# Words are runs of letters and digits, except that CJK text, which isn't split
+# up by spaces, is indexed one character at a time.
+_TOKEN = re.compile(f"[^\\W{_CJK}]+|[{_CJK}]")
+
+
+def _tokenize(s: str) -> typing.List[str]:
+    return _TOKEN.findall(s)
+
+
+def effect_text(card: ygojson.Card, language: ygojson.Language) -> str:
+    """The lowercased text that effect searches look at."""
+    text = card.text[language]
+    return ((text.pendulum_effect or "") + "\n" + (text.effect or "")).strip().lower()
+
+
+def _stat_column(
+    things: typing.List[Thing],
+    stat: StatGetter,
+) -> numpy.ndarray:
+    column = numpy.full(len(things), MISSING, dtype=numpy.int64)
+    for i, thing in enumerate(things):
+        if type(thing) is ygojson.Card:
+            value = stat(thing)
+            if type(value) is int:
+                column[i] = value
+            elif value == "?":
+                column[i] = UNKNOWN
+    return column
+
+
+def _frozen(bits: Bits) -> Bits:
+    bits.flags.writeable = False
+    return bits
+
+
+T = typing.TypeVar("T")
+
+
+def _checking(
+    check_deadline: typing.Optional[DeadlineCheck], items: typing.Iterable[T]
+) -> typing.Iterator[T]:
+    """Go through items, checking the deadline every `DEADLINE_CHECK_INTERVAL`."""
+    if check_deadline is None:
+        yield from items
+        return
+    for i, item in enumerate(items):
+        if i % DEADLINE_CHECK_INTERVAL == 0:
+            check_deadline()
+        yield item
+
+
+class _Lookup:
+    """A lookup of which of all things match something, cached like with
+    `functools.lru_cache`. It can also be asked to only look within some things,
+    for when earlier search terms have already narrowed them down;
+    that does less work than looking everywhere, so it isn't cached,
+    though a cached lookup of everything is used if there is one.
+    The `check_deadline` argument isn't part of the cache key;
+    lookups that get stopped aren't cached, and ones that finish
+    are the same no matter who asked for them.
+    """
+
+    def __init__(self, function: typing.Callable[..., typing.Any]) -> None:
+        self._function = function
+        self._cache: "collections.OrderedDict[typing.Hashable, typing.Any]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __call__(
+        self,
+        *args: typing.Hashable,
+        within: typing.Optional[Bits] = None,
+        check_deadline: typing.Optional[DeadlineCheck] = None,
+    ) -> typing.Any:
+        with self._lock:
+            result = self._cache.get(args)
+            if result is not None:
+                self._cache.move_to_end(args)
+                return result
+        if within is not None and not within.all():
+            return self._function(*args, within=within, check_deadline=check_deadline)
+        result = self._function(*args, check_deadline=check_deadline)
+        with self._lock:
+            self._cache[args] = result
+            while len(self._cache) > LOOKUP_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+def _restrict(candidates: Ids, within: typing.Optional[Bits]) -> Ids:
+    """Keep only the candidates in `within`, if given."""
+    return candidates if within is None else candidates[within[candidates]]
+
+
+def _ngrams(s: str) -> typing.Set[str]:
+    return {s[i : i + NGRAM_LENGTH] for i in range(len(s) - NGRAM_LENGTH + 1)}
+
+
+def _intersect_sorted(candidates: Ids, other: Ids) -> Ids:
+    if not len(other):
+        return other
+    positions = numpy.searchsorted(other, candidates)
+    positions[positions == len(other)] = 0
+    return candidates[other[positions] == candidates]
+
+
+def fuzzy_errors(query: str) -> int:
+    """How many typos a fuzzy search for the query tolerates.
+    Queries need to be long enough that they still share trigrams
+    with what they match, or they would have to be checked against every name.
+    """
+    return min((len(query) - 1) // 5, FUZZY_MAX_ERRORS)
+
+
+class FuzzyPattern:
+    """A query prepared for Myers' bit-parallel approximate string matching."""
+
+    query: str
+    errors: int
+    peq: typing.Dict[str, int]
+    """For every character of the query, a bitmask of where it appears in it."""
+
+    def __init__(self, query: str) -> None:
+        self.query = query
+        self.errors = fuzzy_errors(query)
+        self.peq = {}
+        for i, c in enumerate(query):
+            self.peq[c] = self.peq.get(c, 0) | (1 << i)
+
+    def distance(self, text: str) -> int:
+        """Get the fewest edits that turn the query into some part of the text."""
+        m = len(self.query)
+        if not m:
+            return 0
+        mask = (1 << m) - 1
+        last = 1 << (m - 1)
+        peq = self.peq
+        pv, mv, score = mask, 0, m
+        best = m
+        for c in text:
+            eq = peq.get(c, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = (mv | ~(xh | pv)) & mask
+            mh = pv & xh
+            if ph & last:
+                score += 1
+            elif mh & last:
+                score -= 1
+                if score < best:
+                    best = score
+            ph = (ph << 1) & mask
+            mh = (mh << 1) & mask
+            pv = (mh | ~(xv | ph)) & mask
+            mv = ph & xv
+        return best
+
+
+class RegexTooSlowError(Exception):
+    """A regular expression search ran out of time."""
+
+
+_QUANTIFIER = re.compile(r"\{(\d*)(,?)(\d*)\}")
+_INLINE_FLAGS = re.compile(r"\(\?[aiLmsux-]+([:)])")
+_CHARACTER_ESCAPE = re.compile(
+    r"\\(x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|N\{[^}]*\}|0[0-7]{0,2}|[0-3][0-7]{2})"
+)
+
+
+def _after(pattern: str, c: str, start: int) -> int:
+    """Get where the next `c` in the pattern from `start` on ends,
+    or the end of the pattern if there isn't one.
+    """
+    end = pattern.find(c, start)
+    return len(pattern) if end < 0 else end + 1
+
+
+def _scan_regex(pattern: str) -> typing.List[str]:
+    """Find substrings that everything a regular expression matches must contain.
+    This is conservative: anything it doesn't understand just isn't required.
+    Raises ValueError if the regular expression could take too long to match:
+    if it repeats a group that can match in more than one way, like ``(a+)+``
+    or ``(a|aa)*``, as matching those can take exponential time,
+    or if it has more than `REGEX_MAX_REPETITIONS` long repetitions.
+    """
+    literals: typing.List[str] = []
+    run: typing.List[str] = []
+    # For every open group, and the top level, whether it has an alternation
+    # or a repetition of varying length, and so can match in more than one way.
+    ambiguous = [False]
+    long_repetitions = 0
+    # Top-level alternations, inline flags and conditionals
+    # all make substrings in the pattern not required.
+    reliable = True
+    previous: typing.Optional[typing.Tuple[str, bool]] = None
+    i = 0
+
+    def end_run() -> None:
+        if run:
+            literals.append("".join(run))
+            run.clear()
+
+    while i < len(pattern):
+        c = pattern[i]
+        quantifier = _QUANTIFIER.match(pattern, i) if c == "{" else None
+        if c in "*+?" or quantifier:
+            if quantifier:
+                minimum = int(quantifier[1] or 0)
+                maximum: typing.Optional[int] = minimum
+                if quantifier[3]:
+                    maximum = int(quantifier[3])
+                elif quantifier[2]:
+                    maximum = None
+                i = quantifier.end()
+            else:
+                minimum = 0 if c in "*?" else 1
+                maximum = 1 if c == "?" else None
+                i += 1
+            if pattern[i : i + 1] in ("?", "+"):
+                i += 1
+            repeated = maximum is None or maximum > 1
+            if repeated and previous and previous[0] == "group" and previous[1]:
+                raise ValueError("repeats a group that can match in more than one way")
+            if maximum is None or maximum - minimum > REGEX_LONG_REPETITION:
+                long_repetitions += 1
+                if long_repetitions > REGEX_MAX_REPETITIONS:
+                    raise ValueError(
+                        f"has more than {REGEX_MAX_REPETITIONS} repetitions like .* or +"
+                    )
+            ambiguous[-1] = ambiguous[-1] or minimum != maximum
+            if previous and previous[0] == "literal" and minimum == 0 and run:
+                run.pop()
+            if len(ambiguous) == 1:
+                end_run()
+            previous = None
+            continue
+
+        character = _CHARACTER_ESCAPE.match(pattern, i) if c == "\\" else None
+        if character:
+            # Escapes like \x64 and \N{...} are a single literal character.
+            i = character.end()
+            try:
+                atom = (
+                    "literal",
+                    codecs.decode(character[0], "unicode_escape").lower(),
+                )
+            except UnicodeDecodeError:
+                atom = ("other", False)
+        elif c == "\\":
+            escaped = pattern[i + 1 : i + 2]
+            i += 2
+            # Escaped punctuation is literal; escaped letters and digits are classes,
+            # anchors, backreferences, and other things that aren't.
+            atom = (
+                ("literal", escaped.lower())
+                if escaped and not escaped.isalnum()
+                else ("other", False)
+            )
+        elif c == "[":
+            i += 1
+            if pattern[i : i + 1] == "^":
+                i += 1
+            if pattern[i : i + 1] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+            atom = ("other", False)
+        elif c == "(":
+            end_run()
+            previous = None
+            flags = _INLINE_FLAGS.match(pattern, i)
+            if flags:
+                # Flags like (?x) can change what the rest of the pattern means.
+                reliable = False
+                i = flags.end()
+                if flags[1] == ")":
+                    continue
+            elif pattern.startswith("(?#", i):
+                i = _after(pattern, ")", i)
+                continue
+            elif pattern.startswith("(?P=", i):
+                i = _after(pattern, ")", i)
+                previous = ("other", False)
+                continue
+            elif pattern.startswith("(?P<", i):
+                i = _after(pattern, ">", i)
+            elif pattern.startswith("(?<=", i) or pattern.startswith("(?<!", i):
+                i += 4
+            elif pattern.startswith("(?(", i):
+                reliable = False
+                i = _after(pattern, ")", i + 3)
+            elif pattern.startswith("(?", i):
+                i += 3
+            else:
+                i += 1
+            ambiguous.append(False)
+            continue
+        elif c == ")":
+            i += 1
+            group_ambiguous = ambiguous.pop() if len(ambiguous) > 1 else False
+            ambiguous[-1] = ambiguous[-1] or group_ambiguous
+            atom = ("group", group_ambiguous)
+        elif c == "|":
+            i += 1
+            if len(ambiguous) == 1:
+                reliable = False
+            ambiguous[-1] = True
+            end_run()
+            previous = None
+            continue
+        elif c in ".^$":
+            i += 1
+            atom = ("other", False)
+        else:
+            i += 1
+            atom = ("literal", c.lower())
+
+        if len(ambiguous) == 1 and atom[0] == "literal":
+            run.append(typing.cast(str, atom[1]))
+        elif len(ambiguous) == 1:
+            end_run()
+        previous = atom
+
+    end_run()
+    return literals if reliable else []
+
+
+class RegexPattern:
+    """A regular expression prepared for searching, along with the substrings
+    that every text it matches must contain, for finding candidates with an index.
+    Searches are case-insensitive.
+    """
+
+    pattern: str
+    regex: typing.Pattern[str]
+    literals: typing.List[str]
+
+    def __init__(self, pattern: str) -> None:
+        """Raises ValueError if the pattern is invalid or could be too slow."""
+        self.pattern = pattern
+        try:
+            self.regex = re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(str(e))
+        self.literals = _scan_regex(pattern)
+
+    def search(
+        self,
+        texts: typing.Iterable[typing.Tuple[int, str]],
+        deadline: float,
+        check_deadline: typing.Optional[DeadlineCheck] = None,
+    ) -> typing.List[int]:
+        """Get the IDs of texts the pattern matches somewhere in.
+        Raises RegexTooSlowError if this is still going at the deadline,
+        a `time.perf_counter` value. Both it and `check_deadline`
+        are checked before every text, since one text can take a while.
+        """
+        search = self.regex.search
+        result = []
+        for id, text in texts:
+            if time.perf_counter() > deadline:
+                raise RegexTooSlowError(self.pattern)
+            if check_deadline is not None:
+                check_deadline()
+            if search(text):
+                result.append(id)
+        return result
+
+
+@functools.lru_cache(maxsize=REGEX_CACHE_SIZE)
+def regex_pattern(pattern: str) -> RegexPattern:
+    """Prepare a regular expression for searching. The result is cached."""
+    return RegexPattern(pattern)
+
+
+class TrigramIndex:
+    """An inverted index from every three-character substring of a set of texts
+    to the IDs of the texts containing it.
+    """
+
+    texts: typing.Dict[int, str]
+    ids: Ids
+    postings: typing.Dict[str, Ids]
+    exact: typing.Dict[str, Ids]
+
+    def __init__(self, texts: typing.Dict[int, str]) -> None:
+        self.texts = texts
+        self.ids = numpy.array(sorted(texts), dtype=numpy.int32)
+
+        postings: typing.Dict[str, typing.List[int]] = {}
+        exact: typing.Dict[str, typing.List[int]] = {}
+        for id in self.ids.tolist():
+            text = texts[id]
+            exact.setdefault(text, []).append(id)
+            for ngram in _ngrams(text):
+                postings.setdefault(ngram, []).append(id)
+        self.postings = {
+            k: numpy.array(v, dtype=numpy.int32) for k, v in postings.items()
+        }
+        self.exact = {k: numpy.array(v, dtype=numpy.int32) for k, v in exact.items()}
+
+    def candidates(self, query: str) -> Ids:
+        """Get the IDs of texts that may contain the query.
+        This is exact for queries shorter than three characters.
+        """
+        ngrams = _ngrams(query)
+        if not ngrams:
+            return self.ids
+
+        lists = []
+        for ngram in ngrams:
+            if ngram not in self.postings:
+                return self.ids[:0]
+            lists.append(self.postings[ngram])
+        lists.sort(key=len)
+
+        result = lists[0]
+        for other in lists[1:]:
+            if len(result) <= VERIFY_THRESHOLD:
+                break
+            result = _intersect_sorted(result, other)
+        return result
+
+    def estimate(self, query: str) -> int:
+        """Get an upper bound on how many texts contain the query."""
+        ngrams = _ngrams(query)
+        if not ngrams:
+            return len(self.ids)
+        return min(len(self.postings.get(ngram, ())) for ngram in ngrams)
+
+    def search(
+        self,
+        query: str,
+        check_deadline: typing.Optional[DeadlineCheck] = None,
+        within: typing.Optional[Bits] = None,
+    ) -> Ids:
+        """Get the IDs of texts containing the query.
+        If `within` is given, only texts with IDs in it are checked.
+        """
+        if not query:
+            return self.ids
+        texts = self.texts
+        candidates = _restrict(self.candidates(query), within)
+        return numpy.array(
+            [
+                id
+                for id in _checking(check_deadline, candidates.tolist())
+                if query in texts[id]
+            ],
+            dtype=numpy.int32,
+        )
+
+    def search_exact(self, query: str) -> Ids:
+        """Get the IDs of texts equal to the query."""
+        return self.exact.get(query, self.ids[:0])
+
+    def fuzzy_estimate(self, query: str, errors: int) -> int:
+        """Get an upper bound on how many texts `fuzzy_search` will find."""
+        ngrams = _ngrams(query)
+        threshold = len(ngrams) - NGRAM_LENGTH * errors
+        if threshold <= 0:
+            return len(self.ids)
+        hits = sum(len(self.postings.get(ngram, ())) for ngram in ngrams)
+        return min(hits // threshold, len(self.ids))
+
+    def fuzzy_candidates(self, query: str, errors: int) -> Ids:
+        """Get the IDs of texts that may be within some number of typos of the query."""
+        # Every typo changes at most three trigrams, so a text within some number
+        # of typos of the query still has the rest of the query's trigrams.
+        ngrams = _ngrams(query)
+        threshold = len(ngrams) - NGRAM_LENGTH * errors
+        if threshold <= 0:
+            return self.ids
+        lists = [self.postings[ngram] for ngram in ngrams if ngram in self.postings]
+        if not lists:
+            return self.ids[:0]
+        ids, counts = numpy.unique(numpy.concatenate(lists), return_counts=True)
+        return ids[counts >= threshold]
+
+    def fuzzy_search(
+        self,
+        pattern: FuzzyPattern,
+        check_deadline: typing.Optional[DeadlineCheck] = None,
+    ) -> typing.Tuple[Ids, numpy.ndarray]:
+        """Get the IDs of texts with a part within `pattern.errors` typos of it,
+        and how many typos away each one is.
+        """
+        texts = self.texts
+        ids = []
+        distances = []
+        candidates = self.fuzzy_candidates(pattern.query, pattern.errors)
+        for id in _checking(check_deadline, candidates.tolist()):
+            distance = pattern.distance(texts[id])
+            if distance <= pattern.errors:
+                ids.append(id)
+                distances.append(distance)
+        return numpy.array(ids, dtype=numpy.int32), numpy.array(
+            distances, dtype=numpy.int32
+        )
+
+
+class EffectIndex:
+    """An inverted index from every word of a set of texts to where it appears.
+    Postings are keys of the form ``(id << POSITION_BITS) | position``,
+    so a phrase can be matched by shifting each word's keys back by its offset
+    in the phrase and intersecting.
+    """
+
+    ids: Ids
+    vocabulary: typing.List[str]
+    """Every word in the index, sorted."""
+    postings: typing.Dict[str, numpy.ndarray]
+    documents: typing.Dict[str, Ids]
+
+    def __init__(self, texts: typing.Dict[int, str]) -> None:
+        self.ids = numpy.array(sorted(texts), dtype=numpy.int32)
+
+        postings: typing.Dict[str, typing.List[int]] = {}
+        for id in self.ids.tolist():
+            for position, word in enumerate(_tokenize(texts[id])):
+                postings.setdefault(word, []).append((id << POSITION_BITS) | position)
+        self.vocabulary = sorted(postings)
+        self.postings = {
+            k: numpy.array(v, dtype=numpy.int64) for k, v in postings.items()
+        }
+        self.documents = {
+            k: numpy.unique(v >> POSITION_BITS).astype(numpy.int32)
+            for k, v in self.postings.items()
+        }
+
+    def words_with_prefix(self, prefix: str) -> typing.List[str]:
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = start
+        while end < len(self.vocabulary) and self.vocabulary[end].startswith(prefix):
+            end += 1
+        return self.vocabulary[start:end]
+
+    def words_with_suffix(self, suffix: str) -> typing.List[str]:
+        return [word for word in self.vocabulary if word.endswith(suffix)]
+
+    def words_containing(self, infix: str) -> typing.List[str]:
+        return [word for word in self.vocabulary if infix in word]
+
+    def _union_documents(self, words: typing.List[str]) -> Ids:
+        if not words:
+            return self.ids[:0]
+        if len(words) == 1:
+            return self.documents[words[0]]
+        return numpy.unique(numpy.concatenate([self.documents[w] for w in words]))
+
+    def _union_postings(self, words: typing.List[str]) -> numpy.ndarray:
+        if len(words) == 1:
+            return self.postings[words[0]]
+        return numpy.unique(numpy.concatenate([self.postings[w] for w in words]))
+
+    def phrase(self, phrase: typing.List[typing.List[str]]) -> Ids:
+        """Get the IDs of texts where, for some position, the word there is one of
+        ``phrase[0]``, the word after that is one of ``phrase[1]``, and so on.
+        """
+        if len(phrase) == 1:
+            return self._union_documents(phrase[0])
+        if not all(phrase):
+            return self.ids[:0]
+
+        # Start with the rarest words, so the intersection shrinks fastest.
+        order = sorted(
+            range(len(phrase)),
+            key=lambda i: sum(len(self.postings[w]) for w in phrase[i]),
+        )
+        result: typing.Optional[numpy.ndarray] = None
+        for offset in order:
+            keys = self._union_postings(phrase[offset]) - offset
+            if result is None:
+                result = keys
+            else:
+                result = numpy.intersect1d(result, keys, assume_unique=True)
+            if not len(result):
+                return self.ids[:0]
+        assert result is not None
+        return numpy.unique(result >> POSITION_BITS).astype(numpy.int32)
+
+    def estimate(self, query: str) -> int:
+        """Get a rough estimate of how many texts contain the query."""
+        counts = [
+            len(self.documents[w]) for w in _tokenize(query) if w in self.documents
+        ]
+        return min(counts) if counts else len(self.ids)
+
+    def candidates(self, query: str, exact: bool) -> typing.Tuple[Ids, bool]:
+        """Get the IDs of texts that may contain (or, if exact, equal) the query.
+        Also returns whether every candidate is known to match,
+        so that the caller doesn't have to check them.
+        """
+        words = _tokenize(query)
+        if not words:
+            return self.ids, False
+        if exact:
+            return (
+                self.phrase([[w] if w in self.postings else [] for w in words]),
+                False,
+            )
+        if len(words) == 1:
+            # The query may start and end in the middle of a word.
+            return (
+                self._union_documents(self.words_containing(words[0])),
+                query == words[0],
+            )
+
+        # Only the first word of the query may start in the middle of a word,
+        # and only the last may end in the middle of one.
+        phrase = [self.words_with_suffix(words[0])]
+        for word in words[1:-1]:
+            phrase.append([word] if word in self.postings else [])
+        phrase.append(self.words_with_prefix(words[-1]))
+        return self.phrase(phrase), False
+
+
+MISSING_NAME = "\ufffd"
+"""What things without a name in a language are sorted as."""
+
+
+def popularity(thing: Thing) -> int:
+    """A cheap measure of how well-known a thing is, for ranking suggestions:
+    how many other things it's linked to.
+    """
+    if type(thing) is ygojson.Card:
+        return len(thing.sets)
+    elif type(thing) is ygojson.Set:
+        return sum(len(contents.cards) for contents in thing.contents)
+    elif type(thing) is ygojson.Series:
+        return len(thing.members)
+    return 0
+
+
+class PrefixIndex:
+    """Names in sorted order, for finding the best names that start with a prefix.
+    The best few for every very short prefix are found ahead of time,
+    since those match too many names to rank on every keystroke.
+    """
+
+    names: typing.List[str]
+    ids: Ids
+    """The dense ID of the thing with every name in `names`."""
+    ranks: numpy.ndarray
+    """How good a suggestion every name in `names` is; lower is better."""
+    best: typing.Dict[str, Ids]
+
+    def __init__(self, texts: typing.Dict[int, str], popularity: numpy.ndarray) -> None:
+        entries = sorted(texts.items(), key=lambda x: (x[1], x[0]))
+        self.names = [name for _, name in entries]
+        self.ids = numpy.array([id for id, _ in entries], dtype=numpy.int64)
+        order = sorted(
+            range(len(entries)),
+            key=lambda i: (-popularity[self.ids[i]], len(self.names[i]), i),
+        )
+        self.ranks = numpy.empty(len(entries), dtype=numpy.int64)
+        self.ranks[order] = numpy.arange(len(entries))
+
+        self.best = {}
+        for length in range(SUGGEST_PRECOMPUTED_LENGTH + 1):
+            for prefix in {name[:length] for name in self.names if len(name) >= length}:
+                self.best[prefix] = self._best(*self._range(prefix), SUGGESTIONS)
+
+    def _range(self, prefix: str) -> typing.Tuple[int, int]:
+        return (
+            bisect.bisect_left(self.names, prefix),
+            bisect.bisect_left(self.names, prefix + "\U0010ffff"),
+        )
+
+    def _best(self, start: int, stop: int, limit: int) -> Ids:
+        ranks = self.ranks[start:stop]
+        if len(ranks) > limit:
+            positions = numpy.argpartition(ranks, limit - 1)[:limit]
+        else:
+            positions = numpy.arange(len(ranks))
+        positions = positions[numpy.argsort(ranks[positions])]
+        return self.ids[start + positions]
+
+    def search(self, prefix: str, limit: int = SUGGESTIONS) -> Ids:
+        """Get the IDs of the things with the best names starting with the prefix,
+        best first.
+        """
+        if len(prefix) <= SUGGEST_PRECOMPUTED_LENGTH and limit <= SUGGESTIONS:
+            return self.best.get(prefix, self.ids[:0])[:limit]
+        return self._best(*self._range(prefix), limit)
+
+
+class EnumIndex:
+    """Packed bitsets of the things that have each of a small vocabulary of values.
+    A query is matched against the vocabulary, not against every thing,
+    and then the bitsets of the values it matched are combined.
+    """
+
+    n: int
+    vocabulary: typing.List[str]
+    bitsets: numpy.ndarray
+    """One row of packed bits per value in `vocabulary`."""
+    counts: numpy.ndarray
+    """How many things have each value in `vocabulary`."""
+
+    def __init__(self, values: typing.Dict[int, typing.List[str]], n: int) -> None:
+        things: typing.Dict[str, typing.List[int]] = {}
+        for i, vs in values.items():
+            for v in vs:
+                things.setdefault(v, []).append(i)
+        self.n = n
+        self.vocabulary = sorted(things)
+        rows = numpy.zeros((len(self.vocabulary), n), dtype=numpy.bool_)
+        for row, v in enumerate(self.vocabulary):
+            rows[row, things[v]] = True
+        self.bitsets = numpy.packbits(rows, axis=1)
+        self.counts = numpy.count_nonzero(rows, axis=1)
+
+    def words(self, query: str, exact: bool) -> typing.List[int]:
+        """Get the rows of the values in the vocabulary that the query matches."""
+        if exact:
+            row = bisect.bisect_left(self.vocabulary, query)
+            if row < len(self.vocabulary) and self.vocabulary[row] == query:
+                return [row]
+            return []
+        return [row for row, v in enumerate(self.vocabulary) if query in v]
+
+    def estimate(self, query: str, exact: bool) -> int:
+        return min(int(self.counts[self.words(query, exact)].sum()), self.n)
+
+    def count_within(self, bits: Bits) -> typing.Dict[str, int]:
+        """Count how many of the given things have each value, most common first."""
+        packed = numpy.packbits(bits)
+        counts = {}
+        for v, row in zip(self.vocabulary, self.bitsets):
+            count = int(numpy.count_nonzero(numpy.unpackbits(row & packed)))
+            if v and count:
+                counts[v] = count
+        return dict(sorted(counts.items(), key=lambda x: -x[1]))
+
+    def match(self, query: str, exact: bool) -> Bits:
+        """Find things with any value that equals (or contains) the query."""
+        rows = self.words(query, exact)
+        if not rows:
+            return numpy.zeros(self.n, dtype=numpy.bool_)
+        packed = numpy.bitwise_or.reduce(self.bitsets[rows], axis=0)
+        return numpy.unpackbits(packed, count=self.n).view(numpy.bool_)
+
+
+class SortKey:
+    """Integer ranks to sort things by, in both directions.
+    Things with equal ranks are tied.
+    Things that can't be sorted, such as cards without an ATK when sorting by ATK,
+    go last in both directions.
+    """
+
+    ascending: numpy.ndarray
+    descending: numpy.ndarray
+
+    def __init__(self, ranks: numpy.ndarray, sortable: Bits) -> None:
+        """Things that are sortable must rank before things that aren't."""
+        self.ascending = ranks
+        top = ranks[sortable].max() if sortable.any() else 0
+        self.descending = numpy.where(sortable, top - ranks, ranks)
+
+    @classmethod
+    def of_values(cls, values: numpy.ndarray, sortable: Bits) -> "SortKey":
+        """Make a key sorting things by the given values,
+        with unsortable things after them, ranked by their values too.
+        """
+        offset = numpy.where(sortable, 0, 1)
+        ranks = numpy.unique(
+            numpy.stack([offset, values]), axis=1, return_inverse=True
+        )[1]
+        return cls(ranks.astype(numpy.int32), sortable)
+
+    def __getitem__(self, descending: bool) -> numpy.ndarray:
+        return self.descending if descending else self.ascending
+
+
+_RANGES: typing.Dict[
+    typing.Callable[[typing.Any, typing.Any], typing.Any],
+    typing.Callable[[int, int, int], typing.Tuple[int, int]],
+] = {
+    operator.eq: lambda left, right, n: (left, right),
+    operator.lt: lambda left, right, n: (0, left),
+    operator.le: lambda left, right, n: (0, right),
+    operator.gt: lambda left, right, n: (right, n),
+    operator.ge: lambda left, right, n: (left, n),
+}
+
+
+class DateColumn:
+    """A date for every thing, stored as ordinals (see `datetime.date.toordinal`),
+    or `MISSING` for things without one.
+    Also stores the things with dates sorted by date,
+    so that comparisons are a binary search and a slice.
+    """
+
+    values: numpy.ndarray
+    order: Ids
+    """The IDs of every thing with a date, ordered by date."""
+    sorted_values: numpy.ndarray
+
+    def __init__(self, values: numpy.ndarray) -> None:
+        self.values = values
+        self.order = numpy.flatnonzero(values != MISSING).astype(numpy.int32)
+        self.order = self.order[numpy.argsort(values[self.order], kind="stable")]
+        self.sorted_values = values[self.order]
+
+    def date(self, id: int) -> typing.Optional[datetime.date]:
+        value = self.values[id]
+        return None if value == MISSING else datetime.date.fromordinal(int(value))
+
+    def _range(
+        self, op: typing.Callable[[typing.Any, typing.Any], typing.Any], value: int
+    ) -> slice:
+        left = int(numpy.searchsorted(self.sorted_values, value, "left"))
+        right = int(numpy.searchsorted(self.sorted_values, value, "right"))
+        return slice(*_RANGES[op](left, right, len(self.order)))
+
+    def match(
+        self, op: typing.Callable[[typing.Any, typing.Any], typing.Any], value: int
+    ) -> Bits:
+        """Find things whose date compares to the given one with the given operator."""
+        result = numpy.zeros(len(self.values), dtype=numpy.bool_)
+        result[self.order[self._range(op, value)]] = True
+        return _frozen(result)
+
+    def estimate(
+        self, op: typing.Callable[[typing.Any, typing.Any], typing.Any], value: int
+    ) -> float:
+        range_ = self._range(op, value)
+        return (range_.stop - range_.start) / max(len(self.values), 1)
+
+
+def in_locale(thing: Thing, locale: ygojson.Locale) -> bool:
+    """Whether a thing was officially released in a locale.
+    Series don't have locales, so they're in every locale with a name for them.
+    """
+    if type(thing) is ygojson.Card:
+        text = thing.text.get(locale.language)
+        return text is not None and bool(text.official)
+    elif type(thing) is ygojson.Series:
+        return locale.language in thing.name
+    else:
+        return locale in thing.locales
+
+
+def _release_dates(
+    db: ygojson.Database, ids: typing.Dict[int, int], n: int
+) -> typing.Tuple[numpy.ndarray, typing.Dict[ygojson.Locale, numpy.ndarray]]:
+    """Find the first release date of every thing, both overall and in each locale.
+    A card was released when the first set it was printed in was released.
+    """
+    overall = numpy.full(n, MISSING, dtype=numpy.int64)
+    by_locale: typing.Dict[ygojson.Locale, numpy.ndarray] = {}
+
+    def released(
+        i: int, locale: typing.Optional[ygojson.Locale], date: datetime.date
+    ) -> None:
+        value = date.toordinal()
+        if overall[i] == MISSING or value < overall[i]:
+            overall[i] = value
+        if locale is not None:
+            if locale not in by_locale:
+                by_locale[locale] = numpy.full(n, MISSING, dtype=numpy.int64)
+            dates = by_locale[locale]
+            if dates[i] == MISSING or value < dates[i]:
+                dates[i] = value
+
+    for set_ in db.sets:
+        # A set's own date only counts for cards not printed in any of its locales.
+        card_locales: typing.Dict[int, typing.Set[ygojson.SetLocale]] = {}
+        for content in set_.contents:
+            for printing in content.cards:
+                if id(printing.card) in ids:
+                    card_locales.setdefault(ids[id(printing.card)], set()).update(
+                        content.locales
+                    )
+        for i, locales in card_locales.items():
+            if not locales and set_.date:
+                released(i, None, set_.date)
+            for locale in locales:
+                if locale.date:
+                    released(i, locale.key, locale.date)
+
+    for product in [*db.sets, *db.products]:
+        i = ids[id(product)]
+        for locale in product.locales.values():
+            if locale.date:
+                released(i, locale.key, locale.date)
+        # A product's own date overrides the dates of its locales.
+        if product.date:
+            overall[i] = product.date.toordinal()
+
+    return overall, by_locale
+
+
+class ResultCache:
+    """A least-recently-used cache of search results, stored as arrays of IDs in ID order.
+    It is limited both in how many results it holds and in their total size.
+    """
+
+    max_entries: int
+    max_bytes: int
+    nbytes: int
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(
+        self, max_entries: int = RESULT_CACHE_SIZE, max_bytes: int = RESULT_CACHE_BYTES
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "collections.OrderedDict[typing.Hashable, Ids]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def fits(self, n: int) -> bool:
+        """Returns whether a result of n things is small enough to be cached."""
+        return n * numpy.dtype(numpy.int32).itemsize <= self.max_bytes
+
+    def get(self, key: typing.Hashable) -> typing.Optional[Ids]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return result
+
+    def put(self, key: typing.Hashable, ids: Ids) -> None:
+        ids = _frozen(ids.astype(numpy.int32))
+        if ids.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key).nbytes
+            self._entries[key] = ids
+            self.nbytes += ids.nbytes
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+
+    def stats(self) -> typing.Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class SearchIndex:
+    """Data structures for searching a database, built once per database load.
+    Every thing in the database gets a dense integer ID: its index in `things`.
+    Things are ordered cards, then sets, then sealed products, then series.
+    Lookups return `Bits`, which are cached, and so are read-only.
+    """
+
+    results: ResultCache
+    """Results of whole searches. Each index has its own,
+    so reloading the database starts with an empty cache.
+    """
+
+    things: typing.List[Thing]
+    ids: typing.Dict[int, int]
+    """Maps the ``id()`` of every thing to its dense ID."""
+    classes: typing.Dict[typing.Type, slice]
+    """The range of dense IDs of every kind of thing."""
+    names: typing.Dict[ygojson.Language, TrigramIndex]
+    effects: typing.Dict[ygojson.Language, EffectIndex]
+    prefixes: typing.Dict[ygojson.Language, PrefixIndex]
+    stats: typing.Dict[str, numpy.ndarray]
+    """For every stat in `STATS`, the value of that stat for every thing."""
+    stat_values: typing.Dict[str, numpy.ndarray]
+    """For every stat in `STATS`, every value of that stat that isn't a sentinel,
+    sorted, for estimating how many things a comparison will match.
+    """
+    stat_orders: typing.Dict[str, Ids]
+    """For every stat in `STATS`, the IDs of the things in `stat_values`, in order."""
+    stat_unknowns: typing.Dict[str, int]
+    locales: typing.Dict[ygojson.Locale, Bits]
+    """The things released in every locale."""
+    enums: typing.Dict[str, EnumIndex]
+    """For every property in `ENUMS`, which cards have which values."""
+    release_dates: DateColumn
+    """The first release date of every thing."""
+    locale_release_dates: typing.Dict[ygojson.Locale, numpy.ndarray]
+    """The first release date of every thing in every locale, as in `DateColumn`.
+    See `release_dates_in` for these in a form that can be searched.
+    """
+    sort_keys: typing.Dict[str, SortKey]
+    """Keys for sorting by every stat in `STATS`, and by "class" and "date"."""
+    name_sort_keys: typing.Dict[ygojson.Language, SortKey]
+
+    def __init__(self, db: ygojson.Database) -> None:
+        self.things = [*db.cards, *db.sets, *db.products, *db.series]
+        self.ids = {id(thing): i for i, thing in enumerate(self.things)}
+        self.results = ResultCache()
+
+        self.classes = {}
+        start = 0
+        for clazz, things in [
+            (ygojson.Card, db.cards),
+            (ygojson.Set, db.sets),
+            (ygojson.SealedProduct, db.products),
+            (ygojson.Series, db.series),
+        ]:
+            self.classes[clazz] = slice(start, start + len(things))
+            start += len(things)
+
+        names: typing.Dict[ygojson.Language, typing.Dict[int, str]] = {}
+        for i, thing in enumerate(self.things):
+            if type(thing) is ygojson.Card:
+                for language, text in thing.text.items():
+                    names.setdefault(language, {})[i] = text.name.lower()
+            else:
+                for language, name in thing.name.items():
+                    names.setdefault(language, {})[i] = name.lower()
+        self.names = {k: TrigramIndex(v) for k, v in names.items()}
+        popularities = numpy.array(
+            [popularity(x) for x in self.things], dtype=numpy.int64
+        )
+        self.prefixes = {k: PrefixIndex(v, popularities) for k, v in names.items()}
+
+        effects: typing.Dict[ygojson.Language, typing.Dict[int, str]] = {}
+        for i, card in enumerate(db.cards):
+            for language in card.text:
+                effects.setdefault(language, {})[i] = effect_text(card, language)
+        self.effects = {k: EffectIndex(v) for k, v in effects.items()}
+
+        self.stats = {k: _stat_column(self.things, v) for k, v in STATS.items()}
+        self.stat_orders = {}
+        for k, column in self.stats.items():
+            known = numpy.flatnonzero(column > UNKNOWN).astype(numpy.int32)
+            self.stat_orders[k] = known[numpy.argsort(column[known], kind="stable")]
+        self.stat_values = {k: self.stats[k][v] for k, v in self.stat_orders.items()}
+        self.stat_unknowns = {
+            k: int(numpy.count_nonzero(v == UNKNOWN)) for k, v in self.stats.items()
+        }
+
+        self.locales = {
+            locale: _frozen(
+                numpy.fromiter(
+                    (in_locale(thing, locale) for thing in self.things),
+                    dtype=numpy.bool_,
+                    count=len(self.things),
+                )
+            )
+            for locale in ygojson.Locale
+        }
+
+        self.enums = {
+            k: EnumIndex(
+                {i: v(card) for i, card in enumerate(db.cards)}, len(self.things)
+            )
+            for k, v in ENUMS.items()
+        }
+
+        release_dates, self.locale_release_dates = _release_dates(
+            db, self.ids, len(self.things)
+        )
+        self.release_dates = DateColumn(release_dates)
+
+        self.sort_keys = {}
+        for k, column in self.stats.items():
+            sortable = column > UNKNOWN
+            # Things with a stat of "?" go before things without the stat.
+            unsortable = numpy.where(column == UNKNOWN, 0, 1)
+            self.sort_keys[k] = SortKey.of_values(
+                numpy.where(sortable, column, unsortable), sortable
+            )
+        classes = numpy.empty(len(self.things), dtype=numpy.int32)
+        for i, range_ in enumerate(self.classes.values()):
+            classes[range_] = i
+        self.sort_keys["class"] = SortKey(classes, self.everything())
+        dates = self.release_dates.values
+        sortable = dates != MISSING
+        self.sort_keys["date"] = SortKey.of_values(
+            numpy.where(sortable, dates, 0), sortable
+        )
+
+        self.name_sort_keys = {}
+        for language, names in self.names.items():
+            keys = [names.texts.get(i, MISSING_NAME) for i in range(len(self.things))]
+            ranks = {key: rank for rank, key in enumerate(sorted(set(keys)))}
+            self.name_sort_keys[language] = SortKey(
+                numpy.array([ranks[key] for key in keys], dtype=numpy.int32),
+                self.everything(),
+            )
+        self._no_name_sort_key = SortKey(
+            numpy.zeros(len(self.things), dtype=numpy.int32), self.everything()
+        )
+
+        self.match_locales = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(
+            self._match_locales
+        )
+        self.match_names = _Lookup(self._match_names)
+        self.fuzzy_names = _Lookup(self._fuzzy_names)
+        self.match_effects = _Lookup(self._match_effects)
+        self.match_regex_names = _Lookup(self._match_regex_names)
+        self.match_regex_effects = _Lookup(self._match_regex_effects)
+        self.match_stat = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(
+            self._match_stat
+        )
+        self.match_enum = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(
+            self._match_enum
+        )
+        self.release_dates_in = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(
+            self._release_dates_in
+        )
+
+    def clear_caches(self) -> None:
+        """Forget every cached search result and lookup, as if no searches
+        had been done yet. Used for benchmarking.
+        """
+        self.results = ResultCache()
+        for lookup in [
+            self.match_locales,
+            self.match_names,
+            self.fuzzy_names,
+            self.match_effects,
+            self.match_regex_names,
+            self.match_regex_effects,
+            self.match_stat,
+            self.match_enum,
+            self.release_dates_in,
+        ]:
+            lookup.cache_clear()
+
+    def nothing(self) -> Bits:
+        return numpy.zeros(len(self.things), dtype=numpy.bool_)
+
+    def everything(self) -> Bits:
+        return numpy.ones(len(self.things), dtype=numpy.bool_)
+
+    def name_sort_key(self, language: ygojson.Language) -> SortKey:
+        return self.name_sort_keys.get(language, self._no_name_sort_key)
+
+    def _composite_key(
+        self, ids: Ids, keys: typing.List[numpy.ndarray]
+    ) -> typing.Optional[numpy.ndarray]:
+        """Combine rank arrays and IDs into one key, unique to every thing,
+        that sorts things the same way as the rank arrays do, ties broken by ID.
+        Returns None if the key wouldn't fit in 64 bits.
+        """
+        ranks = [key[ids].astype(numpy.int64) for key in keys]
+        widths = [int(rank.max()) + 1 if len(rank) else 1 for rank in ranks]
+        if math.prod(widths) * len(self.things) >= 2**63:
+            return None
+        result = numpy.zeros(len(ids), dtype=numpy.int64)
+        for rank, width in zip(ranks, widths):
+            result *= width
+            result += rank
+        result *= len(self.things)
+        result += ids
+        return result
+
+    def sort(
+        self,
+        ids: Ids,
+        keys: typing.List[numpy.ndarray],
+        start: int = 0,
+        stop: typing.Optional[int] = None,
+    ) -> Ids:
+        """Sort things by the given rank arrays, the first being the most significant.
+        Ties are left in ID order. `ids` must be sorted.
+        Only the things that end up in the range [start, stop) are returned,
+        and only they are fully sorted, so getting a page of results from deep
+        in a large set costs little more than getting the first page.
+        """
+        stop = len(ids) if stop is None else min(stop, len(ids))
+        start = max(start, 0)
+        if start >= stop:
+            return ids[:0]
+        if not keys:
+            return ids[start:stop]
+
+        composite = self._composite_key(ids, keys)
+        if composite is None:
+            order = numpy.lexsort([key[ids] for key in reversed(keys)])
+            return ids[order[start:stop]]
+        if stop - start == len(ids):
+            return ids[numpy.argsort(composite)]
+
+        # Partitioning on both ends of the range puts exactly the things
+        # in the range between them, though not in order.
+        partition = numpy.argpartition(composite, sorted({start, stop - 1}))
+        window = partition[start:stop]
+        return ids[window[numpy.argsort(composite[window])]]
+
+    def match_class(self, clazz: typing.Type) -> Bits:
+        result = self.nothing()
+        result[self.classes[clazz]] = True
+        return result
+
+    def estimate_class(self, clazz: typing.Type) -> float:
+        """Get the fraction of things that are of the given class."""
+        range_ = self.classes[clazz]
+        return (range_.stop - range_.start) / max(len(self.things), 1)
+
+    def estimate_names(
+        self, languages: typing.FrozenSet[ygojson.Language], query: str, exact: bool
+    ) -> float:
+        """Estimate the fraction of things that `match_names` will find."""
+        count = 0
+        for language in languages:
+            if language in self.names:
+                names = self.names[language]
+                if exact:
+                    count += len(names.search_exact(query))
+                else:
+                    count += names.estimate(query)
+        return min(count / max(len(self.things), 1), 1.0)
+
+    def estimate_fuzzy_names(
+        self, languages: typing.FrozenSet[ygojson.Language], query: str
+    ) -> float:
+        """Estimate the fraction of things that `fuzzy_names` will find."""
+        errors = fuzzy_errors(query)
+        count = 0
+        for language in languages:
+            if language in self.names:
+                count += self.names[language].fuzzy_estimate(query, errors)
+        return min(count / max(len(self.things), 1), 1.0)
+
+    def estimate_effects(
+        self, languages: typing.FrozenSet[ygojson.Language], query: str
+    ) -> float:
+        """Estimate the fraction of things that `match_effects` will find."""
+        count = 0
+        for language in languages:
+            if language in self.effects:
+                count += self.effects[language].estimate(query)
+        return min(count / max(len(self.things), 1), 1.0)
+
+    def estimate_regex_names(
+        self, languages: typing.FrozenSet[ygojson.Language], pattern: str
+    ) -> float:
+        """Estimate the fraction of things that `match_regex_names` will find."""
+        literals = regex_pattern(pattern).literals
+        count = 0
+        for language in languages:
+            if language in self.names:
+                names = self.names[language]
+                count += min(
+                    (names.estimate(x) for x in literals), default=len(names.ids)
+                )
+        return min(count / max(len(self.things), 1), 1.0)
+
+    def estimate_regex_effects(
+        self, languages: typing.FrozenSet[ygojson.Language], pattern: str
+    ) -> float:
+        """Estimate the fraction of things that `match_regex_effects` will find."""
+        literals = regex_pattern(pattern).literals
+        count = 0
+        for language in languages:
+            if language in self.effects:
+                effects = self.effects[language]
+                count += min(
+                    (effects.estimate(x) for x in literals), default=len(effects.ids)
+                )
+        return min(count / max(len(self.things), 1), 1.0)
+
+    def estimate_stat(
+        self,
+        stat: str,
+        op: typing.Callable[[typing.Any, typing.Any], typing.Any],
+        value: typing.Optional[int],
+    ) -> float:
+        """Get the fraction of things that `match_stat` will find."""
+        if value is None:
+            count = self.stat_unknowns[stat]
+        else:
+            value = max(UNKNOWN + 1, min(value, _INT_MAX))
+            values = self.stat_values[stat]
+            left = numpy.searchsorted(values, value, "left")
+            right = numpy.searchsorted(values, value, "right")
+            count = {
+                operator.eq: right - left,
+                operator.lt: left,
+                operator.le: right,
+                operator.gt: len(values) - right,
+                operator.ge: len(values) - left,
+            }[op]
+        return int(count) / max(len(self.things), 1)
+
+    def estimate_enum(self, enum: str, query: str, exact: bool) -> float:
+        """Estimate the fraction of things that `match_enum` will find."""
+        return self.enums[enum].estimate(query, exact) / max(len(self.things), 1)
+
+    def facet_counts(
+        self, bits: Bits, facet: str, dates: typing.Optional[DateColumn] = None
+    ) -> typing.Dict[str, int]:
+        """Count how many of the given things have each value of a facet in `FACETS`.
+        Things without a value aren't counted. Years come from `dates` if given,
+        and `release_dates` otherwise.
+        """
+        if facet == "class":
+            counts = {
+                CLASS_NAMES[clazz]: int(numpy.count_nonzero(bits[range_]))
+                for clazz, range_ in self.classes.items()
+            }
+            return {k: v for k, v in counts.items() if v}
+        elif facet == "year":
+            if dates is None:
+                dates = self.release_dates
+            values = dates.values[bits]
+            values, counts = numpy.unique(values[values != MISSING], return_counts=True)
+            years: typing.Dict[str, int] = {}
+            for value, count in zip(values.tolist(), counts.tolist()):
+                year = str(datetime.date.fromordinal(value).year)
+                years[year] = years.get(year, 0) + count
+            return years
+        elif facet in self.enums:
+            return self.enums[facet].count_within(bits)
+        elif facet in self.stats:
+            column = self.stats[facet][bits]
+            values, counts = numpy.unique(column[column != MISSING], return_counts=True)
+            return {
+                "?" if value == UNKNOWN else str(value): count
+                for value, count in zip(values.tolist(), counts.tolist())
+            }
+        raise KeyError(facet)
+
+    def _match_locales(self, locales: typing.FrozenSet[ygojson.Locale]) -> Bits:
+        """Find things released in any of the given locales."""
+        result = self.nothing()
+        for locale in locales:
+            result |= self.locales[locale]
+        return _frozen(result)
+
+    def _match_names(
+        self,
+        languages: typing.FrozenSet[ygojson.Language],
+        query: str,
+        exact: bool,
+        within: typing.Optional[Bits] = None,
+        check_deadline: typing.Optional[DeadlineCheck] = None,
+    ) -> Bits:
+        result = self.nothing()
+        for language in languages:
+            if language not in self.names:
+                continue
+            if exact:
+                result[self.names[language].search_exact(query)] = True
+            else:
+                result[
+                    self.names[language].search(query, check_deadline, within)
+                ] = True
+        return _frozen(result)
+
+    def _fuzzy_names(
+        self,
+        languages: typing.FrozenSet[ygojson.Language],
+        query: str,
+        check_deadline: typing.Optional[DeadlineCheck] = None,
+    ) -> numpy.ndarray:
+        """Find how many typos away from a name containing the query every thing is,
+        or `FUZZY_NO_MATCH` if it's too far away to match.
+        """
+        result = numpy.full(len(self.things), FUZZY_NO_MATCH, dtype=numpy.int32)
+        pattern = FuzzyPattern(query)
+        for language in languages:
+            if language not in self.names:
+                continue
+            ids, distances = self.names[language].fuzzy_search(pattern, check_deadline)
+            result[ids] = numpy.minimum(result[ids], distances)
+        return _frozen(result)
+
+    def _match_effects(
+        self,
+        languages: typing.FrozenSet[ygojson.Language],
+        query: str,
+        exact: bool,
+        within: typing.Optional[Bits] = None,
+        check_deadline: typing.Optional[DeadlineCheck] = None,
+    ) -> Bits:
+        result = self.nothing()
+        for language in languages:
+            if language not in self.effects:
+                continue
+            candidates, verified = self.effects[language].candidates(query, exact)
+            candidates = _restrict(candidates, within)
+            if verified:
+                result[candidates] = True
+                continue
+            for id in _checking(check_deadline, candidates.tolist()):
+                text = effect_text(self.things[id], language)
+                if query == text if exact else query in text:
+                    result[id] = True
+        return _frozen(result)
+
+    def _match_regex_names(
+        self,
+        languages: typing.FrozenSet[ygojson.Language],
+        pattern: str,
+        within: typing.Optional[Bits] = None,
+        check_deadline: typing.Optional[DeadlineCheck] = None,
+    ) -> Bits:
+        """Find things with a name the regular expression matches part of.
+        Raises RegexTooSlowError if this takes longer than `REGEX_TIME_BUDGET`.
+        """
+        regex = regex_pattern(pattern)
+        deadline = time.perf_counter() + REGEX_TIME_BUDGET
+        result = self.nothing()
+        for language in languages:
+            if language not in self.names:
+                continue
+            names = self.names[language]
+            candidates = names.ids
+            for literal in regex.literals:
+                candidates = _intersect_sorted(candidates, names.candidates(literal))
+            candidates = _restrict(candidates, within)
+            texts = names.texts
+            result[
+                regex.search(
+                    ((id, texts[id]) for id in candidates.tolist()),
+                    deadline,
+                    check_deadline,
+                )
+            ] = True
+        return _frozen(result)
+
+    def _match_regex_effects(
+        self,
+        languages: typing.FrozenSet[ygojson.Language],
+        pattern: str,
+        within: typing.Optional[Bits] = None,
+        check_deadline: typing.Optional[DeadlineCheck] = None,
+    ) -> Bits:
+        """Find cards with an effect the regular expression matches part of.
+        Raises RegexTooSlowError if this takes longer than `REGEX_TIME_BUDGET`.
+        """
+        regex = regex_pattern(pattern)
+        deadline = time.perf_counter() + REGEX_TIME_BUDGET
+        result = self.nothing()
+        for language in languages:
+            if language not in self.effects:
+                continue
+            effects = self.effects[language]
+            candidates = effects.ids
+            for literal in regex.literals:
+                candidates = _intersect_sorted(
+                    candidates, effects.candidates(literal, False)[0]
+                )
+            candidates = _restrict(candidates, within)
+            things = self.things
+            result[
+                regex.search(
+                    (
+                        (id, effect_text(things[id], language))
+                        for id in candidates.tolist()
+                    ),
+                    deadline,
+                    check_deadline,
+                )
+            ] = True
+        return _frozen(result)
+
+    def _match_stat(
+        self,
+        stat: str,
+        op: typing.Callable[[typing.Any, typing.Any], typing.Any],
+        value: typing.Optional[int],
+    ) -> Bits:
+        """Find things whose stat compares to the value with the given operator.
+        If the value is None, finds things where the stat is "?" instead.
+        """
+        column = self.stats[stat]
+        if value is None:
+            return _frozen(column == UNKNOWN)
+        # No stat is this big or small; compare to the nearest one that could be.
+        value = max(UNKNOWN + 1, min(value, _INT_MAX))
+        return _frozen(op(column, value) & (column > UNKNOWN))
+
+    def match_stats(
+        self,
+        stat: str,
+        comparisons: typing.List[
+            typing.Tuple[
+                typing.Callable[[typing.Any, typing.Any], typing.Any],
+                typing.Optional[int],
+            ]
+        ],
+    ) -> typing.List[Bits]:
+        """Like `match_stat`, for many comparisons to the same stat at once.
+        Every comparison is a binary search and a slice of the stat's sorted order,
+        rather than another pass over the whole column.
+        """
+        order, values = self.stat_orders[stat], self.stat_values[stat]
+        results = []
+        for op, value in comparisons:
+            if value is None:
+                results.append(self.match_stat(stat, op, value))
+                continue
+            value = max(UNKNOWN + 1, min(value, _INT_MAX))
+            left = int(numpy.searchsorted(values, value, "left"))
+            right = int(numpy.searchsorted(values, value, "right"))
+            result = self.nothing()
+            result[order[slice(*_RANGES[op](left, right, len(order)))]] = True
+            results.append(_frozen(result))
+        return results
+
+    def _match_enum(self, enum: str, query: str, exact: bool) -> Bits:
+        """Find cards with a value of the given property in `ENUMS`
+        that equals the query, or contains it if not exact.
+        """
+        return _frozen(self.enums[enum].match(query, exact))
+
+    def _release_dates_in(
+        self, locales: typing.FrozenSet[ygojson.Locale]
+    ) -> DateColumn:
+        """Get the first release date of every thing in any of the given locales."""
+        values = numpy.full(len(self.things), MISSING, dtype=numpy.int64)
+        for locale in locales:
+            dates = self.locale_release_dates.get(locale)
+            if dates is None:
+                continue
+            earlier = (dates != MISSING) & ((values == MISSING) | (dates < values))
+            values[earlier] = dates[earlier]
+        return DateColumn(values)
+
+
+# This must not be keyed on anything the index refers to,
+# or the database would never be freed.
+_indexes: "weakref.WeakKeyDictionary[ygojson.Database, SearchIndex]" = (
+    weakref.WeakKeyDictionary()
+)
+_indexes_lock = threading.Lock()
+
+
+def get_index(db: ygojson.Database) -> SearchIndex:
+    """Get the index for a database, building it if it hasn't been built yet."""
+    with _indexes_lock:
+        if db not in _indexes:
+            _indexes[db] = SearchIndex(db)
+        return _indexes[db]
+
+
+def build_index(db: ygojson.Database) -> SearchIndex:
+    """Build a new index for a database, replacing any already built for it,
+    so that `get_index` returns it from now on.
+    """
+    index = SearchIndex(db)
+    with _indexes_lock:
+        _indexes[db] = index
+    return index
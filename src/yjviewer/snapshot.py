@@ -0,0 +1,236 @@
+import contextlib
+import gc
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import threading
+import typing
+
+import ygojson
+
+from .version import __version__
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILENAME = "yjviewer.snapshot"
+SNAPSHOT_VERSION = 1
+
+AGGREGATE_FILENAMES = [
+    ygojson.META_FILENAME,
+    ygojson.AGG_CARDS_FILENAME,
+    ygojson.AGG_SETS_FILENAME,
+    ygojson.AGG_SERIES_FILENAME,
+    ygojson.AGG_DISTROS_FILENAME,
+    ygojson.AGG_PRODUCTS_FILENAME,
+]
+
+# Cards, sets and printings all link to each other once backlinks are generated,
+# so pickling the database recurses very deeply. We pickle on a thread with a
+# stack big enough to handle that.
+PICKLE_RECURSION_LIMIT = 1000000
+PICKLE_STACK_SIZE = 512 * 1024 * 1024
+
+FileInfo = typing.Tuple[int, int, str]
+"""Size, modification time in nanoseconds, and SHA-256 of an aggregate file."""
+
+
+def snapshot_path(aggregates_dir: str) -> str:
+    return os.path.join(aggregates_dir, SNAPSHOT_FILENAME)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def aggregate_stats(aggregates_dir: str) -> typing.Dict[str, typing.Tuple[int, int]]:
+    """Get the size and modification time in nanoseconds of every aggregate file.
+    This is cheap, so it can be used to poll for changes.
+    """
+    result: typing.Dict[str, typing.Tuple[int, int]] = {}
+    for filename in AGGREGATE_FILENAMES:
+        path = os.path.join(aggregates_dir, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        result[filename] = (stat.st_size, stat.st_mtime_ns)
+    return result
+
+
+def _file_infos(aggregates_dir: str) -> typing.Dict[str, FileInfo]:
+    return {
+        filename: (size, mtime, _hash_file(os.path.join(aggregates_dir, filename)))
+        for filename, (size, mtime) in aggregate_stats(aggregates_dir).items()
+    }
+
+
+def _header(aggregates_dir: str) -> typing.Dict[str, typing.Any]:
+    return {
+        "snapshot_version": SNAPSHOT_VERSION,
+        "yjviewer_version": __version__,
+        "ygojson_version": ygojson.__version__,
+        "schema_version": ygojson.SCHEMA_VERSION,
+        "python_version": tuple(sys.version_info[:2]),
+        "files": _file_infos(aggregates_dir),
+    }
+
+
+def _is_fresh(header: typing.Dict[str, typing.Any], aggregates_dir: str) -> bool:
+    if (
+        header.get("snapshot_version") != SNAPSHOT_VERSION
+        or header.get("yjviewer_version") != __version__
+        or header.get("ygojson_version") != ygojson.__version__
+        or header.get("schema_version") != ygojson.SCHEMA_VERSION
+        or header.get("python_version") != tuple(sys.version_info[:2])
+    ):
+        return False
+
+    files: typing.Dict[str, FileInfo] = header.get("files", {})
+    for filename in AGGREGATE_FILENAMES:
+        path = os.path.join(aggregates_dir, filename)
+        if not os.path.exists(path):
+            if filename in files:
+                return False
+            continue
+        if filename not in files:
+            return False
+        size, mtime, sha = files[filename]
+        stat = os.stat(path)
+        if stat.st_size != size:
+            return False
+        # Re-extracting the aggregates touches every file without changing it,
+        # so only fall back to hashing when the modification time differs.
+        if stat.st_mtime_ns != mtime and _hash_file(path) != sha:
+            return False
+    return True
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # The database is millions of small objects; letting the cyclic GC run
+    # while they are being created more than doubles load times.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def snapshot_is_fresh(aggregates_dir: str) -> bool:
+    """Whether there is an up-to-date snapshot for the given aggregates directory.
+    Only reads the snapshot's header, not the database in it.
+    """
+    path = snapshot_path(aggregates_dir)
+    try:
+        with open(path, "rb") as file:
+            header = pickle.load(file)
+    except Exception:
+        return False
+    return isinstance(header, dict) and _is_fresh(header, aggregates_dir)
+
+
+def load_snapshot(aggregates_dir: str) -> typing.Optional[ygojson.Database]:
+    """Load the pre-linked database snapshot for the given aggregates directory.
+    Returns None if there is no snapshot, or if it is out of date.
+    """
+    path = snapshot_path(aggregates_dir)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "rb") as file:
+            header = pickle.load(file)
+            if not _is_fresh(header, aggregates_dir):
+                logger.info(f"Snapshot {path} is out of date; ignoring it")
+                return None
+            with _gc_paused():
+                db: ygojson.Database = pickle.load(file)
+    except Exception:
+        logger.exception(f"Could not read snapshot {path}; ignoring it")
+        return None
+
+    db.aggregates_dir = aggregates_dir
+    return db
+
+
+def save_snapshot(
+    db: ygojson.Database,
+    aggregates_dir: str,
+    header: typing.Optional[typing.Dict[str, typing.Any]] = None,
+) -> None:
+    """Write a pre-linked snapshot of the given database next to its aggregates.
+    Pass in a header made before the aggregates were read, so that files changing
+    during the load leave the snapshot out of date instead of wrongly fresh.
+    """
+    if header is None:
+        header = _header(aggregates_dir)
+    path = snapshot_path(aggregates_dir)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    error: typing.List[BaseException] = []
+
+    def write():
+        old_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(old_limit, PICKLE_RECURSION_LIMIT))
+        try:
+            with open(temp_path, "wb") as file:
+                pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(db, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except BaseException as e:
+            error.append(e)
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+        finally:
+            sys.setrecursionlimit(old_limit)
+
+    old_stack_size = threading.stack_size(PICKLE_STACK_SIZE)
+    try:
+        thread = threading.Thread(target=write, name="yjviewer-snapshot")
+        thread.start()
+    finally:
+        threading.stack_size(old_stack_size)
+    thread.join()
+
+    if error:
+        raise error[0]
+
+
+def _load_from_aggregates(aggregates_dir: str) -> ygojson.Database:
+    with _gc_paused():
+        db = ygojson.load_from_file(aggregates_dir=aggregates_dir)
+        db.regenerate_backlinks()
+    return db
+
+
+def load_database(aggregates_dir: str) -> ygojson.Database:
+    """Load the database, preferring an up-to-date snapshot if there is one.
+    If the aggregates are missing, they are downloaded first.
+    If the snapshot is missing or out of date, a new one is written.
+    """
+    if os.path.exists(aggregates_dir):
+        db = load_snapshot(aggregates_dir)
+        if db is not None:
+            return db
+        header = _header(aggregates_dir)
+        db = _load_from_aggregates(aggregates_dir)
+    else:
+        with _gc_paused():
+            db = ygojson.load_from_internet(aggregates_dir=aggregates_dir)
+            db.regenerate_backlinks()
+        header = _header(aggregates_dir)
+
+    # The snapshot is only a cache, so failing to write it for any reason,
+    # such as the database being too deep or too big to pickle, isn't fatal.
+    try:
+        save_snapshot(db, aggregates_dir, header)
+    except Exception:
+        logger.warning(f"Could not write snapshot for {aggregates_dir}", exc_info=True)
+    return db
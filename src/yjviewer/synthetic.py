@@ -0,0 +1,224 @@
+import datetime
+import random
+import typing
+import uuid
+
+import ygojson
+
+NAME_WORDS = """
+dark magician blue eyes white dragon red chaos soldier black luster elemental hero
+destiny cyber angel knight warrior burst stream of destruction mirror force pot greed
+raigeki harpie lady sister ash blossom joyous spring ghost ogre snow rabbit kuriboh
+""".split()
+EFFECT_PHRASES = [
+    "when this card is normal summoned",
+    "you can target 1 monster your opponent controls",
+    "destroy it",
+    "draw 2 cards",
+    "banish it face-down",
+    "from your graveyard",
+    "special summon 1 monster",
+    "add 1 card from your deck to your hand",
+    "once per turn",
+    "during either player's turn",
+    "negate the activation",
+    "send it to the gy",
+    "this card gains 500 atk",
+    "cannot be destroyed by battle",
+]
+LANGUAGES = [
+    ygojson.Language.ENGLISH,
+    ygojson.Language.JAPANESE,
+    ygojson.Language.FRENCH,
+    ygojson.Language.GERMAN,
+]
+LOCALES = [
+    ygojson.Locale.ENGLISH,
+    ygojson.Locale.ENGLISH_AMERICA,
+    ygojson.Locale.JAPANESE,
+    ygojson.Locale.FRENCH,
+    ygojson.Locale.GERMAN,
+]
+FIRST_DATE = datetime.date(1999, 1, 1)
+DAYS = 9000
+"""How many days after `FIRST_DATE` release dates can be."""
+
+
+def _uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128))
+
+
+def _name(rng: random.Random, min_words: int, max_words: int) -> str:
+    n = rng.randint(min_words, max_words)
+    return " ".join(rng.choice(NAME_WORDS) for _ in range(n)).title()
+
+
+def _effect(rng: random.Random) -> str:
+    n = rng.randint(1, 8)
+    return ", ".join(rng.choice(EFFECT_PHRASES) for _ in range(n)).capitalize() + "."
+
+
+def _date(rng: random.Random) -> typing.Optional[datetime.date]:
+    if rng.random() < 0.1:
+        return None
+    return FIRST_DATE + datetime.timedelta(days=rng.randrange(DAYS))
+
+
+def _stat(rng: random.Random) -> typing.Union[None, int, str]:
+    roll = rng.random()
+    if roll < 0.05:
+        return "?"
+    if roll < 0.1:
+        return None
+    return rng.randrange(0, 5000, 50)
+
+
+def _card(rng: random.Random, i: int) -> ygojson.Card:
+    name = _name(rng, 1, 4)
+    text = {}
+    for language in LANGUAGES:
+        if language == ygojson.Language.ENGLISH or rng.random() < 0.6:
+            text[language] = ygojson.CardText(
+                name=name
+                if language == ygojson.Language.ENGLISH
+                else f"{name} {language.value}",
+                effect=_effect(rng),
+                pendulum_effect=_effect(rng) if rng.random() < 0.05 else None,
+                official=rng.random() < 0.95,
+            )
+
+    card_type = rng.choice(
+        [ygojson.CardType.MONSTER] * 3 + [ygojson.CardType.SPELL, ygojson.CardType.TRAP]
+    )
+    properties: typing.Dict[str, typing.Any] = {}
+    if card_type == ygojson.CardType.MONSTER:
+        monster_card_types = rng.sample(
+            list(ygojson.MonsterCardType), rng.randint(0, 1)
+        )
+        properties = dict(
+            attribute=rng.choice(list(ygojson.Attribute)),
+            type=rng.choice(list(ygojson.Race)),
+            monster_card_types=monster_card_types,
+            classifications=rng.sample(list(ygojson.Classification), rng.randint(1, 2)),
+            abilities=rng.sample(list(ygojson.Ability), rng.randint(0, 1)),
+            atk=_stat(rng),
+            def_=_stat(rng),
+        )
+        if ygojson.MonsterCardType.XYZ in monster_card_types:
+            properties["rank"] = rng.randint(0, 13)
+        elif ygojson.MonsterCardType.LINK in monster_card_types:
+            properties["link_arrows"] = rng.sample(
+                list(ygojson.LinkArrow), rng.randint(1, 5)
+            )
+            properties["def_"] = None
+        else:
+            properties["level"] = rng.randint(1, 12)
+        if ygojson.MonsterCardType.PENDULUM in monster_card_types:
+            properties["scale"] = rng.randint(0, 13)
+    else:
+        properties = dict(subcategory=rng.choice(list(ygojson.SubCategory)))
+
+    return ygojson.Card(
+        id=_uuid(rng),
+        text=text,
+        card_type=card_type,
+        images=[
+            ygojson.CardImage(
+                id=_uuid(rng), card_art=f"https://example.com/cards/{i}.png"
+            )
+        ],
+        **properties,
+    )
+
+
+def _set(rng: random.Random, i: int, cards: typing.List[ygojson.Card]) -> ygojson.Set:
+    locales = [
+        ygojson.SetLocale(
+            key=locale,
+            language=locale.language.value,
+            prefix=f"SYN{i}-{locale.value.upper()}",
+            date=_date(rng),
+        )
+        for locale in rng.sample(LOCALES, rng.randint(0, 3))
+    ]
+    printings = [
+        ygojson.CardPrinting(
+            id=_uuid(rng),
+            card=rng.choice(cards),
+            suffix=f"{j:03d}",
+            rarity=rng.choice(list(ygojson.CardRarity)),
+        )
+        for j in range(rng.randint(1, 20))
+    ]
+    name = _name(rng, 2, 4)
+    return ygojson.Set(
+        id=_uuid(rng),
+        name={
+            ygojson.Language.ENGLISH: name,
+            ygojson.Language.JAPANESE: f"{name} ja",
+        },
+        locales=locales,
+        contents=[ygojson.SetContents(locales=locales, cards=printings)],
+        date=None if locales else _date(rng),
+    )
+
+
+def _product(
+    rng: random.Random, sets: typing.List[ygojson.Set]
+) -> ygojson.SealedProduct:
+    locales = [
+        ygojson.SealedProductLocale(key=locale, date=_date(rng))
+        for locale in rng.sample(LOCALES, rng.randint(0, 2))
+    ]
+    return ygojson.SealedProduct(
+        id=_uuid(rng),
+        name={ygojson.Language.ENGLISH: _name(rng, 2, 3) + " Box"},
+        locales={x.key: x for x in locales},
+        contents=[
+            ygojson.SealedProductContents(
+                locales=locales,
+                packs={ygojson.SealedProductPack(set=rng.choice(sets)): 1},
+            )
+        ],
+    )
+
+
+def _series(rng: random.Random, cards: typing.List[ygojson.Card]) -> ygojson.Series:
+    return ygojson.Series(
+        id=_uuid(rng),
+        name={ygojson.Language.ENGLISH: _name(rng, 1, 2)},
+        archetype=rng.random() < 0.5,
+        members=set(rng.sample(cards, min(len(cards), rng.randint(1, 20)))),
+    )
+
+
+def make_database(
+    n_cards: int, n_sets: int, n_products: int, n_series: int, seed: int = 0
+) -> ygojson.Database:
+    """Make up a database of the given size, for benchmarking.
+    The same arguments always make the same database.
+    """
+    rng = random.Random(seed)
+    db = ygojson.Database()
+    cards = [_card(rng, i) for i in range(max(n_cards, 1))]
+    for card in cards:
+        db.add_card(card)
+    sets = [_set(rng, i, cards) for i in range(max(n_sets, 1))]
+    for set_ in sets:
+        db.add_set(set_)
+    for _ in range(n_products):
+        db.add_product(_product(rng, sets))
+    for _ in range(n_series):
+        db.add_series(_series(rng, cards))
+    db.regenerate_backlinks()
+    return db
+
+
+def scaled_database(db: ygojson.Database, scale: float) -> ygojson.Database:
+    """Make up a database with `scale` times as many of everything as the given one."""
+    return make_database(
+        round(len(db.cards) * scale),
+        round(len(db.sets) * scale),
+        round(len(db.products) * scale),
+        round(len(db.series) * scale),
+    )
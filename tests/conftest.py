@@ -0,0 +1,24 @@
+import pytest
+
+import yjviewer
+from yjviewer import searchindex, snapshot, synthetic
+
+
+@pytest.fixture(scope="session")
+def db():
+    return synthetic.make_database(2000, 400, 100, 50)
+
+
+@pytest.fixture
+def index(db):
+    index = searchindex.get_index(db)
+    index.clear_caches()
+    return index
+
+
+@pytest.fixture
+def client(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "load_database", lambda aggregates_dir: db)
+    app = yjviewer.create_app(str(tmp_path))
+    app.extensions["yjviewer"].wait()
+    return app.test_client()
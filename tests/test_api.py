@@ -0,0 +1,113 @@
+import json
+
+import ygojson
+
+from yjviewer import api, search, searchindex
+
+
+def _results(db, query, stop=None):
+    index = searchindex.get_index(db)
+    ids = search.Search(query).execute_ids(db, 0, stop)[0]
+    if stop is not None:
+        ids = ids[:stop]
+    return [api.serialize(index, id, api.DEFAULT_FIELDS) for id in ids.tolist()]
+
+
+def test_search_pages_through_every_result(db, client):
+    query = "class:card sort:atk-desc"
+    expected = _results(db, query)
+    assert len(expected) > 2 * 300
+
+    results = []
+    args = {"query": query, "limit": 300}
+    while True:
+        response = client.get("/api/search", query_string=args)
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        assert response.headers["X-Result-Count"] == str(len(expected))
+        results.extend(json.loads(line) for line in response.text.splitlines())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        args = {"cursor": response.headers["X-Next-Cursor"], "limit": 300}
+    assert results == expected
+
+    response = client.get("/api/search", query_string={"query": "nonsense:x"})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_facets_match_the_search(db, client):
+    query = "locale:fr"
+    response = client.get("/api/facets", query_string={"query": query})
+    assert response.status_code == 200
+    facets = response.get_json()["facets"]
+    assert set(facets) == set(search.DEFAULT_FACETS)
+    assert facets == search.Search(query).facet_counts(db, search.DEFAULT_FACETS)
+
+    response = client.get("/api/facets", query_string={"facets": "year,nonsense"})
+    assert response.status_code == 400
+    assert "nonsense" in response.get_json()["error"]
+
+
+def test_batch_matches_separate_searches(db, index, client):
+    queries = ["class:card", "dark", "class:card dark", "nonsense:x", "locale:fr"]
+    response = client.post("/api/batch", json={"queries": queries, "limit": 20})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert len(results) == len(queries)
+    for query, result in zip(queries, results):
+        if query == "nonsense:x":
+            assert "error" in result
+            continue
+        expected = _results(db, query, 20)
+        assert expected
+        assert result == {
+            "count": search.Search(query).execute_ids(db)[1],
+            "results": expected,
+        }
+
+    response = client.post("/api/batch", json={"queries": "dark"})
+    assert response.status_code == 400
+
+
+def test_suggest_finds_names_starting_with_the_prefix(index, client):
+    texts = index.names[ygojson.Language.ENGLISH].texts
+    prefix = texts[0][:3]
+    matching = {
+        api.serialize(index, id, ["id"])["id"]
+        for id, text in texts.items()
+        if text.startswith(prefix)
+    }
+
+    for limit in [3, api.MAX_SUGGESTIONS]:
+        response = client.get(
+            "/api/suggest", query_string={"q": prefix.upper(), "limit": limit}
+        )
+        assert response.status_code == 200
+        suggestions = response.get_json()
+        assert len(suggestions) == min(limit, len(matching))
+        assert all(x["name"].lower().startswith(prefix) for x in suggestions)
+        assert {x["id"] for x in suggestions} <= matching
+
+    response = client.get("/api/suggest", query_string={"q": prefix, "lang": "xx"})
+    assert response.status_code == 400
+
+
+def test_explain_shows_every_step_of_the_search(db, client):
+    query = "name~/dar/ class:card sort:atk-desc"
+    response = client.get("/api/explain", query_string={"query": query})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["count"] == search.Search(query).execute_ids(db)[1]
+
+    explanation = body["explanation"]
+    assert explanation["output"] == body["count"]
+    steps = explanation["children"]
+    # The cheap class filter runs before the regular expression.
+    assert [x["step"] for x in steps] == ['class:"card"', "name~/dar/", "sort"]
+    assert steps[0]["input"] == explanation["input"]
+    for before, after in zip(steps, steps[1:]):
+        assert after["input"] == before["output"]
+
+    response = client.get("/api/explain", query_string={"query": "name~/(/"})
+    assert response.status_code == 400
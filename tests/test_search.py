@@ -0,0 +1,110 @@
+import pytest
+import ygojson
+
+from yjviewer import search, searchindex
+
+
+def test_first_page_is_never_fully_sorted(db, index, monkeypatch):
+    calls = []
+    sort = searchindex.SearchIndex.sort
+
+    def spy(self, ids, keys, start=0, stop=None):
+        calls.append((len(ids), start, stop))
+        return sort(self, ids, keys, start, stop)
+
+    monkeypatch.setattr(searchindex.SearchIndex, "sort", spy)
+    per_page = search.SEARCH_RESULTS_PER_PAGE
+    query = ":card sort:atk-desc"
+
+    for _ in range(2):
+        ids, total = search.Search(query).execute_ids(db, 0, per_page)
+        assert len(ids) == per_page
+
+    assert total > per_page
+    assert calls == [(total, 0, per_page)] * 2
+    assert index.results.stats()["hits"] == 1
+    assert search.Search(query).execute_ids(db)[0][:per_page].tolist() == ids.tolist()
+
+
+class Stopped(Exception):
+    pass
+
+
+def _stop_at_second_check():
+    checks = []
+
+    def check_deadline():
+        checks.append(None)
+        if len(checks) > 1:
+            raise Stopped()
+
+    return check_deadline
+
+
+@pytest.mark.parametrize(
+    "lookup,query,spied",
+    [
+        ("fuzzy_names", ("ab",), (searchindex.FuzzyPattern, "distance")),
+        ("match_effects", ("destroy it", False), (searchindex, "effect_text")),
+    ],
+)
+def test_slow_lookups_stop_soon_after_the_deadline(
+    index, monkeypatch, lookup, query, spied
+):
+    calls = []
+    owner, name = spied
+    original = getattr(owner, name)
+
+    def spy(*args):
+        calls.append(None)
+        return original(*args)
+
+    monkeypatch.setattr(owner, name, spy)
+    languages = frozenset([ygojson.Language.ENGLISH])
+
+    with pytest.raises(Stopped):
+        getattr(index, lookup)(
+            languages, *query, check_deadline=_stop_at_second_check()
+        )
+    assert 0 < len(calls) <= searchindex.DEADLINE_CHECK_INTERVAL
+
+    # Lookups that were stopped aren't cached.
+    calls.clear()
+    getattr(index, lookup)(languages, *query)
+    assert len(calls) > searchindex.DEADLINE_CHECK_INTERVAL
+
+
+def test_slow_filters_only_check_what_earlier_terms_left(db, index, monkeypatch):
+    calls = []
+    original = searchindex.effect_text
+
+    def spy(*args):
+        calls.append(None)
+        return original(*args)
+
+    monkeypatch.setattr(searchindex, "effect_text", spy)
+    name = index.names[ygojson.Language.ENGLISH].texts[0]
+    named = search.Search(f'name="{name}"').execute_ids(db)[0].tolist()
+    assert calls == []
+
+    # The planner runs the regular expression last, on only the named things.
+    ids = search.Search(f'effect~/e/ name="{name}"').execute_ids(db)[0].tolist()
+    assert 0 < len(calls) <= len(named)
+
+    calls.clear()
+    everything = search.Search("effect~/e/").execute_ids(db)[0].tolist()
+    assert len(calls) > len(named)
+    assert sorted(ids) == sorted(set(everything) & set(named))
+
+
+@pytest.mark.parametrize("query", ["", "locale:fr", "class:card locale:ja|de"])
+def test_facet_counts_match_their_refine_queries(db, index, query):
+    counts = search.Search(query).facet_counts(db, searchindex.FACETS)
+    assert counts["year"]
+    for facet, values in counts.items():
+        for value, count in values.items():
+            term = search.facet_term(facet, value)
+            if term is None:
+                continue
+            refined = search.Search(f"{query} {term}").execute_ids(db, 0, 0)[1]
+            assert refined == count, (facet, value)
@@ -0,0 +1,136 @@
+import re
+
+import pytest
+import ygojson
+
+from yjviewer import search, searchindex
+
+ENGLISH = frozenset([ygojson.Language.ENGLISH])
+LANGUAGES = frozenset([ygojson.Language.ENGLISH, ygojson.Language.JAPANESE])
+
+
+def _scan(index, matches):
+    """Find things by checking every one of them, without using the index."""
+    return [i for i, thing in enumerate(index.things) if matches(thing)]
+
+
+def _names(thing):
+    if type(thing) is ygojson.Card:
+        names = {k: v.name for k, v in thing.text.items()}
+    else:
+        names = thing.name
+    return [names[x].lower() for x in LANGUAGES if names.get(x)]
+
+
+@pytest.mark.parametrize(
+    "query,exact",
+    [
+        ("dark", False),
+        ("blue eyes", False),
+        ("ra", False),
+        ("k", False),
+        ("n ja", False),
+        ("zzz", False),
+        ("", False),
+        ("kuriboh", True),
+        ("dark magician", True),
+        ("dark", True),
+    ],
+)
+def test_name_index_matches_a_scan(index, query, exact):
+    expected = _scan(
+        index,
+        lambda thing: any(
+            query == name if exact else query in name for name in _names(thing)
+        ),
+    )
+    assert index.match_names(LANGUAGES, query, exact).nonzero()[0].tolist() == expected
+
+
+@pytest.mark.parametrize(
+    "pattern", ["(a+)+b", "(a|aa)*b", "(ab?)+c", "(x|y){2,}", ".*.*.*x"]
+)
+def test_regexes_that_could_take_too_long_are_rejected(pattern):
+    with pytest.raises(ValueError):
+        searchindex.regex_pattern(pattern)
+    with pytest.raises(search.SearchFailedException):
+        search.Search(f"name~/{pattern}/")
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        "(?x)dar k",
+        "(?x)d a r k \\ m",
+        "(?i)DARK",
+        "(?s:dar)k",
+        "(?#x)dark",
+        "\\x64ark",
+        "\\u0064ark",
+        "\\U00000064ark",
+        "\\N{LATIN SMALL LETTER D}ark",
+        "\\144ark",
+        "dar\\153",
+        "(d)ar\\1?k",
+    ],
+)
+def test_regex_inline_flags_do_not_drop_matches(index, pattern):
+    names = index.names[ygojson.Language.ENGLISH]
+    regex = re.compile(pattern, re.IGNORECASE)
+    expected = sorted(id for id, text in names.texts.items() if regex.search(text))
+    assert expected
+    found = index.match_regex_names(ENGLISH, pattern)
+    assert found.nonzero()[0].tolist() == expected
+
+
+def test_regex_search_stops_at_the_search_deadline(db, index):
+    checked = []
+
+    def check_deadline():
+        checked.append(None)
+        raise search.SearchTimeoutException("stopped")
+
+    with pytest.raises(search.SearchTimeoutException):
+        index.match_regex_effects(ENGLISH, "destroy", check_deadline=check_deadline)
+    assert len(checked) == 1
+
+    with pytest.raises(search.SearchTimeoutException):
+        search.Search("e~/destroy/", timeout=0).execute_ids(db)
+
+
+def test_regex_time_budget_is_checked_before_every_text(index, monkeypatch):
+    monkeypatch.setattr(searchindex, "REGEX_TIME_BUDGET", -1.0)
+    with pytest.raises(searchindex.RegexTooSlowError):
+        index.match_regex_effects(ENGLISH, "destroy")
+
+
+def _effects(thing):
+    if type(thing) is not ygojson.Card:
+        return []
+    return [searchindex.effect_text(thing, x) for x in LANGUAGES if x in thing.text]
+
+
+@pytest.mark.parametrize(
+    "query,exact",
+    [
+        ("destroy", False),
+        ("estro", False),
+        ("special summon", False),
+        ("it, draw 2", False),
+        ("ummon 1 mon", False),
+        ("gy.", False),
+        ("once per turn.", True),
+        ("destroy it.", True),
+        ("draw 2 cards.", True),
+    ],
+)
+def test_effect_index_matches_a_scan(index, query, exact):
+    expected = _scan(
+        index,
+        lambda thing: any(
+            query == text if exact else query in text for text in _effects(thing)
+        ),
+    )
+    assert expected
+    found = index.match_effects(LANGUAGES, query, exact)
+    assert found.nonzero()[0].tolist() == expected
@@ -0,0 +1,46 @@
+import os
+import pickle
+
+import yjviewer
+from yjviewer import snapshot, synthetic
+
+
+def test_load_database_survives_failed_snapshot(tmp_path, monkeypatch):
+    db = synthetic.make_database(20, 5, 2, 2)
+    monkeypatch.setattr(snapshot, "_load_from_aggregates", lambda _: db)
+
+    def dump(obj, file, protocol=None):
+        file.write(b"partial")
+        raise pickle.PicklingError("can't pickle this")
+
+    monkeypatch.setattr(snapshot.pickle, "dump", dump)
+
+    assert snapshot.load_database(str(tmp_path)) is db
+    assert os.listdir(tmp_path) == []
+
+
+def _build_snapshot(tmp_path, monkeypatch, db, *args):
+    monkeypatch.setattr(snapshot, "_load_from_aggregates", lambda _: db)
+    app = yjviewer.create_app(str(tmp_path))
+    return app.test_cli_runner().invoke(args=["build-snapshot", *args])
+
+
+def test_build_snapshot_command(tmp_path, monkeypatch):
+    db = synthetic.make_database(20, 5, 2, 2)
+    result = _build_snapshot(tmp_path, monkeypatch, db, "--force")
+    assert result.exit_code == 0, result.output
+    assert "is up to date" in result.output
+    assert snapshot.snapshot_is_fresh(str(tmp_path))
+
+
+def test_build_snapshot_command_fails_if_snapshot_is_not_written(tmp_path, monkeypatch):
+    db = synthetic.make_database(20, 5, 2, 2)
+
+    def dump(obj, file, protocol=None):
+        raise pickle.PicklingError("can't pickle this")
+
+    monkeypatch.setattr(snapshot.pickle, "dump", dump)
+    result = _build_snapshot(tmp_path, monkeypatch, db)
+    assert result.exit_code != 0
+    assert "could not be written" in result.output
+    assert not snapshot.snapshot_is_fresh(str(tmp_path))